@@ -1,3 +1,14 @@
+import json
+import math
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, ParseError, Throttled
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 
@@ -45,4 +56,55 @@ class NewAPIView(APIView):
         for i in fields:
             if i in data:
                 setattr(objj,i,data[i])
-        return objj
\ No newline at end of file
+        return objj
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of NewAPIView for the ASGI deployment. DRF views
+    are sync-only, so this is a plain Django view that parses JSON itself and
+    turns DRF APIExceptions into JSON responses.
+    """
+    serializer_class = None
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated API, same as DRF's APIView.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def check_throttles(self, request):
+        # These views are anonymous, so the throttles only need the client
+        # address; a stand-in request keeps them away from session lookups.
+        throttle_request = SimpleNamespace(user=AnonymousUser(), META=request.META)
+        for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+            throttle = throttle_class()
+            if not throttle.allow_request(throttle_request, self):
+                raise Throttled(throttle.wait())
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            # The throttle store is a SQLite file: keep its I/O off the event loop.
+            await sync_to_async(self.check_throttles)(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            # Same body shape as DRF's default exception handler.
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = JsonResponse(data, status=exc.status_code, safe=False)
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = str(math.ceil(exc.wait))
+            return response
+
+    def get_data(self, request):
+        if not request.body:
+            return {}
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body)
+            except ValueError:
+                raise ParseError()
+        return request.POST.dict()
+
+    def get_serializer(self, *args, **kwargs):
+        return self.serializer_class(*args, **kwargs)
+
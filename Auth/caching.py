@@ -0,0 +1,76 @@
+"""
+Cached GET responses with ETag / Last-Modified validators.
+
+A view using CachedResponseMixin names a cache key per request; whatever
+changes the underlying data deletes (or re-versions) that key. A request whose
+If-None-Match or If-Modified-Since matches the cached entry gets a 304 without
+the view running, so without touching the database.
+
+A replica may not have a write yet when its invalidation empties the cache, so
+for REPLICA_MAX_LAG_SECONDS after `note_write()` misses are rebuilt from the
+primary instead of caching the stale rows.
+"""
+import contextlib
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from Auth.routers import primary_reads
+
+RECENT_WRITE_KEY = 'response_cache:recent_write'
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        # Weak comparison, as for GET in RFC 9110.
+        etags = {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+        return '*' in etags or etag in etags
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and last_modified <= since
+
+
+def note_write():
+    """Call when cached data changes, alongside deleting its keys."""
+    cache.set(RECENT_WRITE_KEY, True, settings.REPLICA_MAX_LAG_SECONDS)
+
+
+class CachedResponseMixin:
+
+    def get_response_cache_key(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def cached_get(self, build, request, *args, **kwargs):
+        """Serve from the cache, calling `build` (the uncached GET) on a miss."""
+        key = self.get_response_cache_key(request, *args, **kwargs)
+        entry = cache.get(key)
+        if entry is None:
+            reads = primary_reads() if cache.get(RECENT_WRITE_KEY) else contextlib.nullcontext()
+            with reads:
+                response = build(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            body = JSONRenderer().render(response.data)
+            entry = {
+                'etag': quote_etag(hashlib.sha1(body).hexdigest()),
+                'last_modified': int(time.time()),
+                'data': json.loads(body),
+            }
+            cache.set(key, entry, settings.RESPONSE_CACHE_SECONDS)
+
+        if is_not_modified(request, entry['etag'], entry['last_modified']):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        # Clients may keep a copy but must revalidate it on every use.
+        response['Cache-Control'] = 'private, no-cache'
+        return response
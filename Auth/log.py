@@ -0,0 +1,141 @@
+"""
+Logging that stays off the request thread.
+
+BoundedQueueHandler puts records on a bounded in-memory queue; a background
+QueueListener hands them to the real handlers (file, console). A full queue
+drops the record instead of blocking the request, and counts it; the count is
+logged as a warning once the queue has room again. JSONFormatter writes one
+compact JSON object per line, and SamplingFilter thins out high-volume records
+such as django.request's 4xx warnings.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        status_code = getattr(record, 'status_code', None)
+        if status_code is not None:
+            entry['status_code'] = status_code
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Passes `rate` of the records below `level`, and every record at or above it."""
+
+    def __init__(self, rate=1.0, level=logging.ERROR):
+        super().__init__()
+        self.rate = rate
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def filter(self, record):
+        return record.levelno >= self.level or self.rate >= 1 or random.random() < self.rate
+
+
+class _Listener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail when stopping with a full queue.
+        self.queue.put(self._sentinel)
+
+
+def _get_handler(name):
+    # logging.getHandlerByName() is Python 3.12+.
+    getter = getattr(logging, 'getHandlerByName', None)
+    return getter(name) if getter else logging._handlers.get(name)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    `handlers` are the handlers the listener thread passes records to, or the
+    names of handlers configured alongside this one. dictConfig sets handlers
+    up in name order, so named ones must sort before this one. The listener
+    starts with the first record, and again in a forked worker.
+    """
+
+    def __init__(self, handlers=(), maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.targets = []
+        for handler in handlers:
+            if isinstance(handler, str):
+                name, handler = handler, _get_handler(handler)
+                if handler is None:
+                    raise ValueError(f'Handler {name!r} is not configured (yet)')
+            self.targets.append(handler)
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Forked: the parent's listener thread did not come along, and
+            # neither did whatever was still in its queue.
+            self.queue = queue.Queue(self.maxsize)
+            self._listener = _Listener(self.queue, *self.targets, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Runs on the calling thread, so only merges the message: the target
+        # handlers format on the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        # Don't keep the request (django.request, django.server) alive in the queue.
+        record.request = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            dropped = self._unreported
+            if dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f'Log queue full: dropped {dropped} records',
+                }))
+                with self._lock:
+                    self._unreported -= dropped
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._unreported += 1
+
+    def close(self):
+        # Flushes what is queued; logging.shutdown() calls this at exit.
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+        super().close()
@@ -0,0 +1,240 @@
+"""
+Per-phase request timing.
+
+`timer(phase)` measures a block of work. Inside a request the time is added to
+that request's Server-Timing header and to the per-endpoint phase histogram;
+outside one (e.g. the outbox worker) it goes to the histogram under
+endpoint="background". `increment(name, labels)` counts events, e.g. cache hits.
+
+Histograms are kept in-process and written every METRICS_FLUSH_SECONDS to a
+file of their own in METRICS_DIR. `/metrics` sums every file in the directory,
+so it covers all prefork workers whichever one serves the scrape. Counts are
+cumulative: empty METRICS_DIR when deploying, not while running.
+
+With METRICS_ENABLED off the middleware removes itself, `timer` returns a
+shared no-op context manager and `increment` does nothing.
+"""
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_METRIC = 'auth_request_duration_seconds'
+PHASE_METRIC = 'auth_phase_duration_seconds'
+
+_NOOP = contextlib.nullcontext()
+_phases = ContextVar('metrics_phases', default=None)
+
+
+class Histograms:
+    """
+    Bucket counts and sums per (metric, labels), merged across processes on read.
+    Counters are kept alongside as one-element entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._series = {}
+        self._pid = os.getpid()
+        self._path = None
+        self._flushed_at = time.monotonic()
+
+    def observe(self, name, labels, seconds):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's counts are already in the parent's file.
+                self._reset()
+            entry = self._series.get((name, labels))
+            if entry is None:
+                entry = self._series[(name, labels)] = [0] * (len(BUCKETS) + 1) + [0.0]
+            entry[bisect_left(BUCKETS, seconds)] += 1
+            entry[-1] += seconds
+
+    def increment(self, name, labels, amount=1):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            entry = self._series.get((name, labels))
+            if entry is None:
+                entry = self._series[(name, labels)] = [0]
+            entry[0] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[name, list(labels), entry[:]] for (name, labels), entry in self._series.items()]
+
+    def flush(self):
+        directory = settings.METRICS_DIR
+        if self._path is None or os.path.dirname(self._path) != directory:
+            os.makedirs(directory, exist_ok=True)
+            self._path = os.path.join(directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        tmp = f'{self._path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, self._path)
+        self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= settings.METRICS_FLUSH_SECONDS:
+            self.flush()
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+
+histograms = Histograms()
+
+
+class _Timer:
+    __slots__ = ('phase', 'started')
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.phase, time.perf_counter() - self.started)
+
+
+def timer(phase):
+    if not settings.METRICS_ENABLED:
+        return _NOOP
+    return _Timer(phase)
+
+
+def record(phase, seconds):
+    phases = _phases.get()
+    if phases is None:
+        histograms.observe(PHASE_METRIC, (('endpoint', 'background'), ('phase', phase)), seconds)
+    else:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+def increment(name, labels, amount=1):
+    if settings.METRICS_ENABLED:
+        histograms.increment(name, labels, amount)
+
+
+def collect():
+    """Sum the histogram files of every process in METRICS_DIR."""
+    histograms.flush()
+    merged = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as f:
+                series = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, entry in series:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = merged.setdefault(key, [0] * len(entry))
+            for i, value in enumerate(entry):
+                total[i] += value
+    return merged
+
+
+def _format_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+
+
+def render(merged):
+    """Prometheus text exposition format."""
+    lines = []
+    for name in sorted({name for name, _ in merged}):
+        series = [(labels, entry) for (series_name, labels), entry in sorted(merged.items()) if series_name == name]
+        if len(series[0][1]) == 1:
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{{{_format_labels(labels)}}} {entry[0]}' for labels, entry in series)
+            continue
+        lines.append(f'# TYPE {name} histogram')
+        for labels, entry in series:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), entry[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{_format_labels(labels + (("le", bound),))}}} {cumulative}')
+            lines.append(f'{name}_sum{{{_format_labels(labels)}}} {entry[-1]}')
+            lines.append(f'{name}_count{{{_format_labels(labels)}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4')
+
+
+class ServerTimingMiddleware:
+    """
+    Collects the phases timed during a request into a Server-Timing header and
+    the endpoint histograms. Goes first in MIDDLEWARE so `total` covers the rest.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        phases = {}
+        token = _phases.set(phases)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _phases.reset(token)
+        return self.finish(request, response, phases, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        phases = {}
+        token = _phases.set(phases)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _phases.reset(token)
+        return self.finish(request, response, phases, time.perf_counter() - started)
+
+    def finish(self, request, response, phases, total):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match and match.url_name) or 'unmatched'
+        histograms.observe(
+            REQUEST_METRIC,
+            (('endpoint', endpoint), ('method', request.method), ('status', f'{response.status_code // 100}xx')),
+            total,
+        )
+        for phase, seconds in phases.items():
+            histograms.observe(PHASE_METRIC, (('endpoint', endpoint), ('phase', phase)), seconds)
+        response['Server-Timing'] = ', '.join(
+            [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in phases.items()]
+            + [f'total;dur={total * 1000:.2f}']
+        )
+        histograms.maybe_flush()
+        return response
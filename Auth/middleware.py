@@ -0,0 +1,76 @@
+"""
+Path-scoped middleware.
+
+Requests under STATELESS_PATH_PREFIXES authenticate with bearer tokens and
+never use sessions, messages, CSRF cookies or framing headers, so
+StatelessPathMiddleware passes them straight to the view. Every other request
+(the admin, the docs) first goes through STATEFUL_MIDDLEWARE, a chain this
+middleware builds and runs the way Django runs MIDDLEWARE, process_view and
+process_exception hooks included.
+
+It goes last in MIDDLEWARE, so the chain it runs sits where those entries
+used to be.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+
+class StatelessPathMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(settings.STATELESS_PATH_PREFIXES)
+        is_async = iscoroutinefunction(get_response)
+        if is_async:
+            markcoroutinefunction(self)
+
+        self.view_middleware = []
+        self.exception_middleware = []
+        handler = get_response
+        for path in reversed(settings.STATEFUL_MIDDLEWARE):
+            middleware_class = import_string(path)
+            if not getattr(middleware_class, 'async_capable' if is_async else 'sync_capable', not is_async):
+                # Django would adapt it with a thread hop; not worth doing here.
+                raise ImproperlyConfigured(f'{path} cannot run in {"async" if is_async else "sync"} mode')
+            try:
+                middleware = middleware_class(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(middleware, 'process_view'):
+                self.view_middleware.insert(0, middleware.process_view)
+            if hasattr(middleware, 'process_exception'):
+                self.exception_middleware.append(middleware.process_exception)
+            handler = convert_exception_to_response(middleware)
+        self.stateful = handler
+
+    def is_stateless(self, request):
+        return request.path_info.startswith(self.prefixes)
+
+    def __call__(self, request):
+        # In async mode both chains return coroutines, which the caller awaits.
+        if self.is_stateless(request):
+            return self.get_response(request)
+        return self.stateful(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_stateless(request):
+            return None
+        for process_view in self.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response:
+                return response
+        return None
+
+    def process_exception(self, request, exception):
+        if self.is_stateless(request):
+            return None
+        for process_exception in self.exception_middleware:
+            response = process_exception(request, exception)
+            if response:
+                return response
+        return None
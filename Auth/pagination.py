@@ -0,0 +1,17 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: each page is `WHERE id > <cursor>
+    ORDER BY id LIMIT n`, so cost does not grow with the table or page number.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        # Read per request, so changed (or overridden) settings apply.
+        self.page_size = settings.USER_LIST_PAGE_SIZE
+        self.max_page_size = settings.USER_LIST_MAX_PAGE_SIZE
+        return super().get_page_size(request)
@@ -1,20 +1,30 @@
-import environ
+from django.conf import settings
 from django.core.mail import send_mail
 from rest_framework import permissions
 
 from Authentication.models import *
 
-env = environ.Env()
-environ.Env.read_env()
-
 def send_email_global(subject,message,rcvr_email):
-    from_email = env('EMAIL_HOST_USER')
+    from_email = settings.EMAIL_HOST_USER
     recipient_list = [rcvr_email]
     try:
         send_mail(subject, message, from_email, recipient_list)
     except Exception as e:
         print(str(e))
 
+
+class CanIntrospectTokens(permissions.BasePermission):
+    """
+    Gateway service accounts, and staff, may introspect tokens. Reads the role
+    claim, so no database lookup.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (
+            user.is_staff or getattr(user, 'role', None) == CustomUser.Role.GATEWAY
+        ))
+
 # class CustomPermission(permissions.BasePermission):
 
 
@@ -0,0 +1,94 @@
+"""
+Per-view SQL query budgets.
+
+A view declares the most queries one request may run with a `query_budget`
+class attribute. QueryBudgetMiddleware counts the queries of every request
+and, depending on QUERY_BUDGET_MODE, logs ('log') or raises ('raise') when a
+view goes over; with the mode unset it removes itself. Tests enforce the same
+numbers with QueryBudgetTestMixin.assertWithinQueryBudget.
+
+Transaction control (BEGIN, COMMIT, savepoints) is not counted: it depends on
+whether the request already runs inside a transaction, as it does in tests.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def counted(sql):
+    return not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS)
+
+
+def get_query_budget(view):
+    """Budget of a view class or of the function returned by its as_view()."""
+    view = getattr(view, 'view_class', view)
+    return getattr(view, 'query_budget', None)
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries and remembers their SQL."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if counted(sql):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+
+    def __init__(self, get_response):
+        self.mode = settings.QUERY_BUDGET_MODE
+        if self.mode not in ('log', 'raise'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(match.func) if match else None
+        if budget is not None and len(counter.queries) > budget:
+            message = (
+                f'{request.method} {request.path} ran {len(counter.queries)} queries, '
+                f'over the budget of {budget} for {match.view_name}'
+            )
+            if self.mode == 'raise':
+                raise QueryBudgetExceeded(message + ':\n' + '\n'.join(counter.queries))
+            logger.warning(message)
+        return response
+
+
+class QueryBudgetTestMixin:
+
+    @contextmanager
+    def assertWithinQueryBudget(self, view, using='default'):
+        budget = get_query_budget(view)
+        if budget is None:
+            self.fail(f'{view.__name__} does not declare a query_budget')
+        with CaptureQueriesContext(connections[using]) as captured:
+            yield captured
+        queries = [query['sql'] for query in captured.captured_queries if counted(query['sql'])]
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{view.__name__} ran {len(queries)} queries, over its budget of {budget}:\n' + '\n'.join(queries),
+        )
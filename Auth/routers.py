@@ -0,0 +1,128 @@
+"""
+Read-replica routing.
+
+Reads go to a replica only where they have been opted in:
+- views with `read_replica = True`, via ReplicaRoutingMiddleware;
+- code running inside `replica_reads()`, e.g. reporting commands.
+
+Everything else, and every write, uses the primary. Once a request has
+written, its remaining reads stay on the primary too, so it never reads
+behind its own write. Replica health is checked at most once every
+REPLICA_HEALTH_CHECK_SECONDS per process; a failing replica is skipped until
+the next check, and with none left reads fall back to the primary.
+"""
+import contextlib
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# None: replica reads not allowed here. False: allowed. True: pinned to the primary.
+_pinned = ContextVar('replica_pinned', default=None)
+_health = {}  # alias -> (healthy, next check)
+
+
+def replica_is_healthy(alias):
+    healthy, check_at = _health.get(alias, (None, 0))
+    now = time.monotonic()
+    if now < check_at:
+        return healthy
+    try:
+        connection = connections[alias]
+        connection.ensure_connection()
+        healthy = connection.is_usable()
+    except DatabaseError:
+        logger.warning("Read replica %s is unreachable", alias, exc_info=True)
+        healthy = False
+    _health[alias] = (healthy, now + settings.REPLICA_HEALTH_CHECK_SECONDS)
+    return healthy
+
+
+def get_read_alias():
+    """A healthy replica if replica reads are allowed in this context, else the primary."""
+    if _pinned.get() is not False:
+        return DEFAULT_DB_ALIAS
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if replica_is_healthy(alias)]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+def pin_primary():
+    if _pinned.get() is False:
+        _pinned.set(True)
+
+
+@contextlib.contextmanager
+def replica_reads():
+    token = _pinned.set(False)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextlib.contextmanager
+def primary_reads():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema from the primary.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Allows replica reads for the duration of requests to `read_replica` views."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _pinned.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+    async def __acall__(self, request):
+        token = _pinned.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if settings.DATABASE_REPLICAS and getattr(view, 'read_replica', False):
+            _pinned.set(False)
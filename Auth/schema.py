@@ -0,0 +1,105 @@
+"""
+OpenAPI schema and Swagger UI, built once per process instead of per request.
+
+`manage.py generate_openapi_schema` writes the schema at build time to
+OPENAPI_SCHEMA_FILE; without that file it is generated on the first request.
+Either way it is kept in memory and served with a strong ETag, so repeat
+visits are answered with a 304.
+
+drf_yasg is only imported when the docs are first served or the schema is
+generated. Views document their operations with the `swagger_auto_schema`
+below, which records its arguments where drf_yasg looks for them.
+"""
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition, require_safe
+
+logger = logging.getLogger(__name__)
+
+INFO = {
+    'title': "Auth System API",
+    'default_version': 'v1',
+    'description': "JWT Authentication System",
+}
+
+_lock = threading.Lock()
+_documents = {}  # name -> (body, etag)
+
+
+def swagger_auto_schema(**overrides):
+    """
+    drf_yasg's decorator of the same name for methods of class-based views,
+    without importing drf_yasg.
+    """
+    def decorator(view_method):
+        view_method._swagger_auto_schema = overrides
+        return view_method
+    return decorator
+
+
+def generate_schema():
+    from drf_yasg import openapi
+    from drf_yasg.app_settings import swagger_settings
+    from drf_yasg.codecs import OpenAPICodecJson
+
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(openapi.Info(**INFO))
+    # No request: the schema must not depend on who asked for it, or it could not be shared.
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(public=True))
+
+
+def render_swagger_ui():
+    from drf_yasg.renderers import SwaggerUIRenderer
+
+    renderer = SwaggerUIRenderer()
+    context = {}
+    renderer.set_context(context)
+    context.update(title=INFO['title'], version=INFO['default_version'])
+    return render_to_string(renderer.template, context).encode()
+
+
+def _read_or_generate_schema():
+    path = settings.OPENAPI_SCHEMA_FILE
+    if path:
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning("OpenAPI schema file %s not found, generating the schema", path)
+    return generate_schema()
+
+
+def load(name, build):
+    document = _documents.get(name)
+    if document is None:
+        with _lock:
+            # One thread builds; the others wait for it rather than all building.
+            document = _documents.get(name)
+            if document is None:
+                body = build()
+                document = _documents[name] = (body, quote_etag(hashlib.sha256(body).hexdigest()))
+    return document
+
+
+def reset():
+    _documents.clear()
+
+
+def _document_view(name, build, content_type):
+    @require_safe
+    @condition(etag_func=lambda request: load(name, build)[1])
+    def view(request):
+        response = HttpResponse(load(name, build)[0], content_type=content_type)
+        # Unchanged until the next deploy, but revalidating costs a 304.
+        response['Cache-Control'] = 'public, no-cache'
+        return response
+    return view
+
+
+schema_view = _document_view('schema', _read_or_generate_schema, 'application/json')
+swagger_ui_view = _document_view('swagger-ui', render_swagger_ui, 'text/html; charset=utf-8')
@@ -1,8 +1,6 @@
 from pathlib import Path
 from datetime import timedelta
 import os
-from django.conf import settings
-from django.core.exceptions import ImproperlyConfigured
 import environ
 
 
@@ -10,6 +8,14 @@ env = environ.Env(
     DEBUG=(bool, True),
     EMAIL_HOST_PASSWORD=(str, ''),  
     FRONTEND_URL=(str, 'http://localhost:3000'),  
+    ASYNC_AUTH_VIEWS=(bool, False),
+    METRICS_ENABLED=(bool, False),
+    QUERY_BUDGET_MODE=(str, ''),
+    DATABASE_CONN_MAX_AGE=(int, 0),
+    REPLICA_DATABASE_URLS=(list, []),
+    OPENAPI_SCHEMA_FILE=(str, ''),
+    LOG_REQUEST_SAMPLE_RATE=(float, 1.0),
+    JWT_KEY_FILES=(list, []),
 )
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,15 +52,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Auth.metrics.ServerTimingMiddleware',
+    'Auth.querybudget.QueryBudgetMiddleware',
+    'Auth.routers.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'Auth.middleware.StatelessPathMiddleware',
+]
+
+# Run by StatelessPathMiddleware for every path outside STATELESS_PATH_PREFIXES
+# (see Auth/middleware.py); the bearer-token API skips them.
+STATEFUL_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+STATELESS_PATH_PREFIXES = ['/api/', '/metrics', '/openapi.json', '/.well-known/']
+# The admin's checks look for these in MIDDLEWARE; they are in STATEFUL_MIDDLEWARE.
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
 
 ROOT_URLCONF = 'Auth.urls'
 
@@ -84,9 +102,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': env('DATABASE_CONN_MAX_AGE'),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas, e.g. REPLICA_DATABASE_URLS=sqlite:////data/replica1.sqlite3,postgres://...?conn_max_age=300
+# They serve views with `read_replica = True` (see Auth/routers.py).
+DATABASE_REPLICAS = []
+for index, url in enumerate(env('REPLICA_DATABASE_URLS'), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        'CONN_MAX_AGE': env('DATABASE_CONN_MAX_AGE'),
+        'CONN_HEALTH_CHECKS': True,
+        **env.db_url_config(url),
+        # Tests read the primary's test database through the replica alias.
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['Auth.routers.ReplicaRouter']
+REPLICA_HEALTH_CHECK_SECONDS = 10
+REPLICA_MAX_LAG_SECONDS = 10  # cached responses are rebuilt from the primary this long after a write
+
+
+# Cache
+# Use a shared backend (e.g. CACHE_URL=rediscache://...) so all workers see
+# token version bumps; the default is per-process memory.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -107,6 +152,22 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+PASSWORD_HASHERS = [
+    'Authentication.hashers.CalibratedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Set from `manage.py calibrate_password_hasher`; 0 keeps Django's default.
+PASSWORD_HASHER_ITERATIONS = env.int('PASSWORD_HASHER_ITERATIONS', default=0)
+
+# Bounded pool that runs password hashing off the request thread
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=os.cpu_count() or 1)
+PASSWORD_HASHING_QUEUE_DEPTH = env.int('PASSWORD_HASHING_QUEUE_DEPTH', default=64)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -136,22 +197,23 @@ AUTH_USER_MODEL = 'Authentication.CustomUser'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Authentication.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'Auth.throttling.AnonSlidingWindowThrottle',
+        'Auth.throttling.UserSlidingWindowThrottle',
+        'Auth.throttling.ScopedSlidingWindowThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
         'user': '1000/day',
         'login': '5/minute',
         'register': '10/hour',
+        'password_reset': '5/hour',
     },
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
 # JWT Configuration
@@ -159,11 +221,12 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=10),
     "ROTATE_REFRESH_TOKENS": True,
-    "BLACKLIST_AFTER_ROTATION": True,
+    # Rotated refresh tokens are retired through Authentication.models.RefreshTokenFamily.
+    "BLACKLIST_AFTER_ROTATION": False,
     "UPDATE_LAST_LOGIN": False,
 
     "ALGORITHM": "HS256",
-    "SIGNING_KEY": settings.SECRET_KEY,
+    "SIGNING_KEY": SECRET_KEY,
     "VERIFYING_KEY": "",
     "AUDIENCE": None,
     "ISSUER": None,
@@ -177,9 +240,9 @@ SIMPLE_JWT = {
     "USER_ID_CLAIM": "user_id",
     "USER_AUTHENTICATION_RULE": "rest_framework_simplejwt.authentication.default_user_authentication_rule",
 
-    "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
+    "AUTH_TOKEN_CLASSES": ("Authentication.tokens.AuthAccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_USER_CLASS": "Authentication.authentication.ClaimsUser",
 
     "AUTH_COOKIE": "access_token",
     "AUTH_COOKIE_SECURE": True,
@@ -192,12 +255,50 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "Authentication.serializers.VersionedTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
+# RS256/EdDSA signing keys as PEM files, the first signs (see Authentication/keyring.py).
+# Unset, tokens are signed with ALGORITHM and SIGNING_KEY above.
+JWT_KEY_FILES = env('JWT_KEY_FILES')
+JWKS_MAX_AGE = 3600  # how long verifiers may cache /.well-known/jwks.json
+
+# In-process BlacklistedToken cache used by DenylistJWTAuthentication
+TOKEN_DENYLIST_REFRESH_SECONDS = 5
+TOKEN_DENYLIST_BUCKET_SECONDS = 3600  # entries are evicted a bucket at a time
+TOKEN_DENYLIST_BLOOM_BITS = 2 ** 16  # per bucket; ~1e-5 false positives at 1000 entries
+TOKEN_DENYLIST_BLOOM_HASHES = 4
+
+# Tokens already verified by this process, skipped until their exp (0 disables)
+VERIFIED_TOKEN_CACHE_SIZE = 10000
+
+# SQLite file holding the throttle counters, shared by all workers on the host
+THROTTLE_STORE_PATH = env('THROTTLE_STORE_PATH', default=str(BASE_DIR / 'throttle.sqlite3'))
+
+# Admin user listing (cursor pagination)
+USER_LIST_PAGE_SIZE = 50
+USER_LIST_MAX_PAGE_SIZE = 500
+# Cached user list/detail responses; invalidated on change, this only bounds
+# staleness from writes that bypass signals or reach only another worker's cache.
+RESPONSE_CACHE_SECONDS = 300
+
+# Bulk user import (Authentication/bulk_import.py)
+BULK_IMPORT_WORKERS = env.int('BULK_IMPORT_WORKERS', default=os.cpu_count() or 1)  # processes
+BULK_IMPORT_BATCH_SIZE = 1000  # rows per worker job and per bulk_create
+BULK_IMPORT_MAX_ERRORS = 100  # row errors kept in the result of an API upload
+BULK_IMPORT_DIR = env('BULK_IMPORT_DIR', default=str(BASE_DIR / 'imports'))  # API uploads, read by `import_users --staged`
+BULK_IMPORT_MAX_BYTES = env.int('BULK_IMPORT_MAX_BYTES', default=100 * 1024 * 1024)  # per API upload
+BULK_IMPORT_RESULT_DAYS = 7  # API import results are kept this long
+
+# Per-user token version map used by ClaimsJWTAuthentication
+TOKEN_VERSION_CACHE_SECONDS = 30  # how stale another worker's view of a revocation may be (twice that without a shared CACHE_URL)
+TOKEN_VERSION_CACHE_SIZE = 100000
+
+# Batch token introspection for API gateways
+TOKEN_INTROSPECTION_MAX_BATCH = 500  # tokens per request
 
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Disable in production
@@ -215,8 +316,25 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = 10  # seconds, per SMTP socket operation
+
+# Email outbox (drained by `manage.py send_queued_emails`)
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_IN_FLIGHT = 200
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BACKOFF = 30  # seconds, doubled on every failed attempt
+EMAIL_OUTBOX_RETRY_BACKOFF_MAX = 3600
+EMAIL_OUTBOX_LEASE_SECONDS = 300
+EMAIL_OUTBOX_RETENTION_DAYS = 30  # SENT and FAILED rows, see purge_outbound_emails
+
+# Request metrics (Server-Timing header and /metrics, see Auth/metrics.py)
+METRICS_ENABLED = env('METRICS_ENABLED')
+METRICS_DIR = env('METRICS_DIR', default=str(BASE_DIR / 'metrics'))  # shared by all workers on the host
+METRICS_FLUSH_SECONDS = 5
+
+# Per-view query budgets (Auth/querybudget.py): '' (off), 'log' or 'raise'
+QUERY_BUDGET_MODE = env('QUERY_BUDGET_MODE')
 
-print()
 # Swagger Settings
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
@@ -229,33 +347,66 @@ SWAGGER_SETTINGS = {
     'USE_SESSION_AUTH': False,
     'PERSIST_AUTH': True,
     'DEFAULT_MODEL_RENDERING': 'example',
+    'SPEC_URL': 'schema-json',
 }
+# Written by `manage.py generate_openapi_schema`; unset, the schema is generated on first request
+OPENAPI_SCHEMA_FILE = env('OPENAPI_SCHEMA_FILE')
 
 # Logging Configuration
+# Records go through a bounded queue to a background thread that writes them as
+# JSON lines (see Auth/log.py); request threads never wait on the file or console.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'Auth.log.JSONFormatter',
+        },
+    },
+    'filters': {
+        # Share of django.request's 4xx warnings to keep; 5xx errors are always kept
+        'sample_requests': {
+            '()': 'Auth.log.SamplingFilter',
+            'rate': env('LOG_REQUEST_SAMPLE_RATE'),
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'debug.log',
+            'formatter': 'json',
         },
         'console': {
             'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+        'queue': {
+            '()': 'Auth.log.BoundedQueueHandler',
+            'handlers': ['file', 'console'],
+            'maxsize': 10000,
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
-            'propagate': True,
+            'propagate': False,
+        },
+        'django.request': {
+            'filters': ['sample_requests'],
         },
     },
+    'root': {
+        'handlers': ['queue'],
+        'level': 'WARNING',
+    },
 }
 
 # Custom Settings
 BACKEND_URL = env('BACKEND_URL')
 FRONTEND_URL = env('FRONTEND_URL')
 VERIFICATION_CODE_EXPIRE_MINUTES = 1440  # 24 hours
+# Serve the async auth views (Authentication/async_views.py); only useful under ASGI.
+ASYNC_AUTH_VIEWS = env('ASYNC_AUTH_VIEWS')
 PASSWORD_RESET_TIMEOUT = 3600  # 1 hour
\ No newline at end of file
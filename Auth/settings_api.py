@@ -0,0 +1,39 @@
+"""
+API-only settings for the JWT workers: DJANGO_SETTINGS_MODULE=Auth.settings_api.
+
+Everything in Auth.settings, minus what only the admin site and the docs UI
+use: no admin, sessions, messages, static files or templates, and JSON
+responses only. Workers start faster and use less memory. The admin site and
+Swagger UI stay on deployments that use Auth.settings; /openapi.json is still
+served here, generating the schema on first request when no prebuilt file is set.
+
+`manage.py startup_report --settings Auth.settings_api` shows the difference.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'corsheaders',
+    'Authentication',
+]
+
+MIDDLEWARE = [
+    'Auth.metrics.ServerTimingMiddleware',
+    'Auth.querybudget.QueryBudgetMiddleware',
+    'Auth.routers.ReplicaRoutingMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'Auth.urls_api'
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
@@ -0,0 +1,87 @@
+"""
+What a worker pays to start: per-module import time and resident memory.
+
+`profile(settings_module)` starts a fresh interpreter with `-X importtime`,
+loads the WSGI application and the URLconf as a worker does before serving its
+first request, and returns the load time, the resident memory afterwards and
+every module imported. Used by `manage.py startup_report`.
+
+`-X importtime` does not list modules loaded with importlib.import_module,
+which is how Django loads settings, app packages and middleware; what those
+import in turn is listed.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+LOADER = 'from Auth.startup import load; load()'
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+
+    # Peak rather than current, but close enough right after startup.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def load():
+    """Run in the child: load what a worker loads, then print the numbers."""
+    started = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import get_resolver
+
+    get_wsgi_application()
+    get_resolver().url_patterns  # otherwise imported by the first request
+    print(json.dumps({'load_ms': round((time.perf_counter() - started) * 1000, 1), 'rss_kb': rss_kb()}))
+
+
+def parse_importtime(output):
+    """(module, self µs, cumulative µs) for each line of `-X importtime` output."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if own.strip().isdigit():  # not the header
+            modules.append((name.strip(), int(own), int(cumulative)))
+    return modules
+
+
+def by_package(modules):
+    totals = {}
+    for name, own, _ in modules:
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + own
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def profile(settings_module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', LOADER],
+        cwd=settings.BASE_DIR,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f'Loading {settings_module} failed:\n{result.stderr[-2000:]}')
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+    report.update(
+        settings=settings_module,
+        import_ms=round(sum(own for _, own, _ in modules) / 1000, 1),
+        modules=modules,
+    )
+    return report
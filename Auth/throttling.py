@@ -0,0 +1,183 @@
+"""
+Sliding-window rate throttles backed by a SQLite file shared by every worker
+on the host.
+
+DRF's stock throttles keep a list of request timestamps per key in the Django
+cache; with the default per-process cache each worker counts on its own. Here
+each key is one row holding the counts of the current and previous fixed
+window, updated with a single UPSERT. The sliding-window estimate weights the
+previous window by how much of it still overlaps the last `duration` seconds.
+Rejected requests are not counted, as with DRF's throttles, and rows whose
+windows have both passed are purged once a minute.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, UserRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# Bump when the table changes; the counts are transient, so an old table is dropped.
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS throttle (
+    key TEXT PRIMARY KEY,
+    window INTEGER NOT NULL,
+    current INTEGER NOT NULL,
+    previous INTEGER NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+HIT = """
+INSERT INTO throttle (key, window, current, previous, expires) VALUES (?, ?, 1, 0, ?)
+ON CONFLICT (key) DO UPDATE SET
+    previous = CASE
+        WHEN window = excluded.window THEN previous
+        WHEN window = excluded.window - 1 THEN current
+        ELSE 0
+    END,
+    current = CASE WHEN window = excluded.window THEN current + 1 ELSE 1 END,
+    window = excluded.window,
+    expires = excluded.expires
+RETURNING current, previous
+"""
+
+UNDO = "UPDATE throttle SET current = current - 1 WHERE key = ?"
+
+PURGE_SECONDS = 60
+
+
+class SlidingWindowStore:
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._next_purge = 0.0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript(
+                    f'DROP TABLE IF EXISTS throttle; {SCHEMA}; PRAGMA user_version = {SCHEMA_VERSION};'
+                )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key, duration, limit=None, now=None):
+        """
+        Count one request for `key`, unless that would take the estimate past
+        `limit`. Returns whether it was counted, the counts of the current and
+        previous window and the seconds elapsed in the current one.
+        """
+        now = time.time() if now is None else now
+        window = int(now // duration)
+        elapsed = now - window * duration
+        conn = self._connection()
+        # IMMEDIATE: no other worker sees a count that is about to be undone.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Both counts are gone once the window after this one has passed.
+            current, previous = conn.execute(HIT, (key, window, (window + 2) * duration)).fetchone()
+            allowed = limit is None or previous * (1 - elapsed / duration) + current <= limit
+            if not allowed:
+                conn.execute(UNDO, (key,))
+                current -= 1
+            if now >= self._next_purge:
+                self._next_purge = now + PURGE_SECONDS
+                conn.execute('DELETE FROM throttle WHERE expires <= ?', (now,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, current, previous, elapsed
+
+    def clear(self):
+        self._connection().execute('DELETE FROM throttle')
+
+
+_stores = {}
+
+
+def get_store():
+    path = settings.THROTTLE_STORE_PATH
+    if path not in _stores:
+        _stores[path] = SlidingWindowStore(path)
+    return _stores[path]
+
+
+class SlidingWindowMixin:
+    """
+    Replaces SimpleRateThrottle's timestamp history with the shared sliding
+    window counter. Rates are read per request so settings overrides apply.
+    """
+
+    def get_rate(self):
+        if not getattr(self, 'scope', None):
+            raise ImproperlyConfigured(
+                f"You must set either `.scope` or `.rate` for '{self.__class__.__name__}' throttle"
+            )
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, self.current, self.previous, self.elapsed = get_store().hit(
+                self.key, self.duration, self.num_requests,
+            )
+        except sqlite3.OperationalError:
+            # A locked or broken store must not take every endpoint down with it.
+            logger.warning("Throttle store unavailable, allowing %s", self.key, exc_info=True)
+            return True
+        return allowed
+
+    def wait(self):
+        """Seconds until the estimate leaves room for one more request."""
+        duration, limit = self.duration, self.num_requests
+        if self.current < limit and self.previous:
+            # Room opens up in this window as the previous one slides out.
+            return max(duration * (1 - (limit - self.current - 1) / self.previous) - self.elapsed, 0)
+        # Otherwise wait into the next window until this one's share has faded.
+        return duration - self.elapsed + duration * max(1 - (limit - 1) / self.current, 0)
+
+
+class AnonSlidingWindowThrottle(SlidingWindowMixin, AnonRateThrottle):
+    pass
+
+
+class UserSlidingWindowThrottle(SlidingWindowMixin, UserRateThrottle):
+    pass
+
+
+class ScopedSlidingWindowThrottle(SlidingWindowMixin, ScopedRateThrottle):
+    """Applies the rate named by the view's `throttle_scope`, if it has one."""
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -1,21 +1,15 @@
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Auth System API",
-        default_version='v1',
-        description="JWT Authentication System",
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from Auth.metrics import metrics_view
+from Auth.schema import schema_view, swagger_ui_view
+from Authentication.keyring import jwks_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('Authentication.urls')),
-    path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-]
\ No newline at end of file
+    path('metrics', metrics_view, name='metrics'),
+    path('.well-known/jwks.json', jwks_view, name='jwks'),
+    path('openapi.json', schema_view, name='schema-json'),
+    path('', swagger_ui_view, name='schema-swagger-ui'),
+]
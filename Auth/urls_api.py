@@ -0,0 +1,13 @@
+from django.urls import path, include
+
+from Auth.metrics import metrics_view
+from Auth.schema import schema_view
+from Authentication.keyring import jwks_view
+
+# Auth.urls without the admin site and Swagger UI, for Auth.settings_api.
+urlpatterns = [
+    path('api/v1/', include('Authentication.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('.well-known/jwks.json', jwks_view, name='jwks'),
+    path('openapi.json', schema_view, name='schema-json'),
+]
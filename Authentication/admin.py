@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, PendingRegistration
 
 class CustomUserAdmin(UserAdmin):
     # Fields to display in the admin list view
@@ -27,4 +27,5 @@ class CustomUserAdmin(UserAdmin):
     )
 
 # Register the CustomUser model with the custom admin class
-admin.site.register(CustomUser)
\ No newline at end of file
+admin.site.register(CustomUser)
+admin.site.register(PendingRegistration)
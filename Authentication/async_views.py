@@ -0,0 +1,175 @@
+"""
+Async versions of the public auth views, served instead of the sync ones when
+ASYNC_AUTH_VIEWS is on (see Authentication/urls.py). They only make sense under
+ASGI, where they avoid a sync_to_async thread hop per request.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from Auth.base import AsyncAPIView
+from Auth.metrics import timer
+from .hashers import acheck_user_password, ahash_password, averify_password
+from .models import CustomUser, PendingRegistration
+from .serializers import (
+    AsyncRegisterSerializer,
+    LoginSerializer,
+    PasswordResetSerializer,
+    PasswordResetConfirmSerializer,
+)
+from .tokens import aget_tokens_for_user
+from .utils import hash_token, asend_verification_email, asend_password_reset_email
+
+
+class AsyncRegisterView(AsyncAPIView):
+    serializer_class = AsyncRegisterSerializer
+    throttle_scope = 'register'
+    query_budget = 4
+
+    async def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=self.get_data(request))
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        email = CustomUser.objects.normalize_email(data['email'])
+        if (await CustomUser.objects.filter(email=email).aexists()
+                or await PendingRegistration.live().filter(email=email).aexists()):
+            return JsonResponse({'email': ['custom user with this email address already exists.']}, status=400)
+
+        verification_code = uuid.uuid4().hex
+        pending = PendingRegistration(
+            email=email,
+            password=await ahash_password(data['password']),
+            first_name=data.get('first_name', ''),
+            last_name=data.get('last_name', ''),
+            phone=data.get('phone', ''),
+            verification_code=hash_token(verification_code),
+            expiry=timezone.now() + timedelta(minutes=settings.VERIFICATION_CODE_EXPIRE_MINUTES),
+        )
+        await PendingRegistration.astage([pending])
+
+        await asend_verification_email(pending, verification_code)
+
+        return JsonResponse(
+            {"message": "Registration successful. Please check your email to verify."},
+            status=201
+        )
+
+class AsyncVerifyEmailView(AsyncAPIView):
+    query_budget = 3
+
+    async def get(self, request):
+        code = request.GET.get('code')
+        if not code:
+            return redirect(f"{settings.FRONTEND_URL}/error?message=Missing verification code")
+
+        code = hash_token(code)
+        pending = await PendingRegistration.objects.filter(verification_code=code).afirst()
+        if pending is None:
+            return await self.verify_user(code)
+        if pending.expiry < timezone.now():
+            return redirect(f"{settings.FRONTEND_URL}/error?message=Verification code expired")
+        try:
+            await pending.apromote()
+        except IntegrityError:
+            return redirect(f"{settings.FRONTEND_URL}/error?message=Email already verified")
+        return redirect(f"{settings.FRONTEND_URL}/login?verified=1")
+
+    async def verify_user(self, code):
+        try:
+            user = await CustomUser.objects.aget(verification_code=code)
+        except CustomUser.DoesNotExist:
+            return redirect(f"{settings.FRONTEND_URL}/error?message=Invalid verification code")
+        if user.verification_code_expiry < timezone.now():
+            return redirect(f"{settings.FRONTEND_URL}/error?message=Verification code expired")
+
+        user.is_active = True
+        user.email_verified = True
+        user.verification_code = None
+        user.verification_code_expiry = None
+        await user.asave(update_fields=['is_active', 'email_verified', 'verification_code', 'verification_code_expiry'])
+
+        return redirect(f"{settings.FRONTEND_URL}/login?verified=1")
+
+class AsyncLoginView(AsyncAPIView):
+    serializer_class = LoginSerializer
+    throttle_scope = 'login'
+    query_budget = 3
+
+    async def post(self, request):
+        serializer = self.get_serializer(data=self.get_data(request))
+        serializer.is_valid(raise_exception=True)
+        email = serializer.validated_data['email']
+        password = serializer.validated_data['password']
+
+        try:
+            with timer('user_lookup'):
+                user = await CustomUser.objects.aget(email=email)
+        except CustomUser.DoesNotExist:
+            pending = await PendingRegistration.live().filter(email=email).afirst()
+            if pending and await averify_password(password, pending.password):
+                return JsonResponse({'error': 'Please verify your email before logging in.'}, status=403)
+            return JsonResponse({'error': 'Invalid credentials'}, status=400)
+        if not await acheck_user_password(user, password):
+            return JsonResponse({'error': 'Invalid credentials'}, status=400)
+        if not user.email_verified:
+            return JsonResponse({'error': 'Please verify your email before logging in.'}, status=403)
+        if not user.can_log_in:
+            return JsonResponse({'error': 'This account has been suspended.'}, status=403)
+
+        return JsonResponse({
+            'uuid': str(user.id),
+            'email': user.email,
+            'role': user.role,
+            'message': 'Login successful',
+            **await aget_tokens_for_user(user),
+        })
+
+class AsyncPasswordResetView(AsyncAPIView):
+    serializer_class = PasswordResetSerializer
+    throttle_scope = 'password_reset'
+    query_budget = 3
+
+    async def post(self, request):
+        serializer = self.get_serializer(data=self.get_data(request))
+        serializer.is_valid(raise_exception=True)
+        email = serializer.validated_data['email']
+
+        try:
+            user = await CustomUser.objects.aget(email=email)
+        except CustomUser.DoesNotExist:
+            return JsonResponse({'error': 'User with this email does not exist'}, status=400)
+
+        reset_token = uuid.uuid4().hex
+        user.reset_token = reset_token
+        user.reset_token_expires = timezone.now() + timedelta(minutes=30)
+        await user.asave(update_fields=['reset_token', 'reset_token_expires'])
+        await asend_password_reset_email(user, reset_token)
+        return JsonResponse({'message': 'Password reset link sent to your email'})
+
+class AsyncPasswordResetConfirmView(AsyncAPIView):
+    serializer_class = PasswordResetConfirmSerializer
+    query_budget = 2
+
+    async def post(self, request):
+        serializer = self.get_serializer(data=self.get_data(request))
+        serializer.is_valid(raise_exception=True)
+        token = serializer.validated_data['token']
+        new_password = serializer.validated_data['new_password']
+
+        try:
+            user = await CustomUser.objects.aget(reset_token=token)
+        except CustomUser.DoesNotExist:
+            return JsonResponse({'error': 'Invalid reset token'}, status=400)
+        if user.reset_token_expires <= timezone.now():
+            return JsonResponse({'error': 'Reset token expired'}, status=400)
+
+        user.password = await ahash_password(new_password)
+        user.reset_token = None
+        user.reset_token_expires = None
+        await user.arevoke_tokens(update_fields=['password', 'reset_token', 'reset_token_expires'])
+        return JsonResponse({'message': 'Password reset successfully'})
@@ -0,0 +1,415 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from Auth.metrics import increment
+
+from .models import BlacklistedToken, CustomUser, RefreshTokenFamily
+from .tokens import FAMILY_CLAIM, TOKEN_VERSION_CLAIM
+
+# Revocation data is always read from the primary: a lagging replica would
+# accept tokens revoked moments ago, even in `read_replica` views.
+ID_OVERLAP = 100
+REVOCATION_OVERLAP = timedelta(seconds=60)
+TOKEN_CACHE_METRIC = 'auth_verified_token_cache_lookups_total'
+HIT = (('result', 'hit'),)
+MISS = (('result', 'miss'),)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter. `key in bloom` can give false positives but never
+    false negatives, so a miss is a definite "not present".
+    """
+
+    def __init__(self, size_bits, num_hashes):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((size_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class TokenDenylist:
+    """
+    In-process copy of the BlacklistedToken table, keyed by `jti`.
+
+    Entries are kept in one Bloom filter per expiry bucket. A token can only be
+    looked up in the bucket of its own `exp` claim, and a whole bucket is dropped
+    once its window has passed, which is how expired entries are evicted. New rows
+    are loaded incrementally (by primary key) at most every
+    TOKEN_DENYLIST_REFRESH_SECONDS, and the database is only asked about a jti when
+    the filter reports a possible hit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._buckets = {}
+            self._last_id = 0
+            self._next_refresh = 0.0
+
+    def _bucket(self, exp):
+        return int(exp) // settings.TOKEN_DENYLIST_BUCKET_SECONDS
+
+    def add(self, jti, exp):
+        # refresh() may be evicting buckets in another thread.
+        with self._lock:
+            self._add(jti, exp)
+
+    def _add(self, jti, exp):
+        bucket = self._bucket(exp)
+        bloom = self._buckets.get(bucket)
+        if bloom is None:
+            bloom = BloomFilter(settings.TOKEN_DENYLIST_BLOOM_BITS, settings.TOKEN_DENYLIST_BLOOM_HASHES)
+            self._buckets[bucket] = bloom
+        bloom.add(jti)
+
+    def _evict(self, now):
+        current = self._bucket(now)
+        for bucket in [b for b in self._buckets if b < current]:
+            del self._buckets[bucket]
+
+    def refresh(self, force=False):
+        if not force and time.monotonic() < self._next_refresh:
+            return
+        # Only one thread reloads; the others keep answering from the current state.
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            now = timezone.now()
+            self._evict(now.timestamp())
+            # Re-read a few ids below the watermark: a transaction that got a lower
+            # id but committed after our last read would otherwise be skipped.
+            since = max(self._last_id - ID_OVERLAP, 0)
+            rows = (
+                BlacklistedToken.objects.using(DEFAULT_DB_ALIAS).filter(id__gt=since, expires_at__gt=now)
+                .order_by('id')
+                .values_list('id', 'jti', 'expires_at')
+            )
+            for pk, jti, expires_at in rows.iterator(chunk_size=2000):
+                self._add(jti, expires_at.timestamp())
+                self._last_id = max(self._last_id, pk)
+            self._next_refresh = time.monotonic() + settings.TOKEN_DENYLIST_REFRESH_SECONDS
+        finally:
+            self._lock.release()
+
+    def might_contain(self, jti, exp):
+        bloom = self._buckets.get(self._bucket(exp))
+        return bloom is not None and jti in bloom
+
+    def is_blacklisted(self, jti, exp):
+        self.refresh()
+        if not self.might_contain(jti, exp):
+            return False
+        return BlacklistedToken.is_token_blacklisted(jti)
+
+    def blacklisted(self, tokens):
+        """
+        The jtis among (jti, exp) pairs that are blacklisted, with one query for
+        all the filter's possible hits.
+        """
+        self.refresh()
+        candidates = [jti for jti, exp in tokens if self.might_contain(jti, exp)]
+        if not candidates:
+            return set()
+        return set(BlacklistedToken.objects.using(DEFAULT_DB_ALIAS).filter(jti__in=candidates).values_list('jti', flat=True))
+
+
+token_denylist = TokenDenylist()
+
+
+class RevokedFamilies:
+    """
+    In-process set of the RefreshTokenFamily rows revoked for reuse, so the
+    access tokens minted from a replayed family are rejected without a query.
+    A family only needs to be kept for ACCESS_TOKEN_LIFETIME after its
+    revocation, when the last of those tokens has expired; that bounds the set.
+    Revocations by other processes are loaded like TokenDenylist's rows, at
+    most every TOKEN_DENYLIST_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._families = {}  # family -> revoked at (timestamp)
+            self._loaded_at = None
+            self._next_refresh = 0.0
+
+    def add(self, family, revoked_at=None):
+        """Add a family, as the hex string of its token claim."""
+        with self._lock:
+            self._families[family] = revoked_at or time.time()
+
+    def refresh(self, force=False):
+        if not force and time.monotonic() < self._next_refresh:
+            return
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            now = timezone.now()
+            horizon = now - api_settings.ACCESS_TOKEN_LIFETIME
+            for family in [f for f, revoked_at in self._families.items() if revoked_at < horizon.timestamp()]:
+                del self._families[family]
+            # Re-read the last few seconds: a revocation may commit after our last read.
+            since = horizon if self._loaded_at is None else max(horizon, self._loaded_at - REVOCATION_OVERLAP)
+            rows = (
+                RefreshTokenFamily.objects.using(DEFAULT_DB_ALIAS)
+                .filter(revoked_at__gt=since)
+                .values_list('family', 'revoked_at')
+            )
+            for family, revoked_at in rows.iterator(chunk_size=2000):
+                self._families[family.hex] = revoked_at.timestamp()
+            self._loaded_at = now
+            self._next_refresh = time.monotonic() + settings.TOKEN_DENYLIST_REFRESH_SECONDS
+        finally:
+            self._lock.release()
+
+    def __contains__(self, family):
+        self.refresh()
+        return family in self._families
+
+
+revoked_families = RevokedFamilies()
+
+
+class VerifiedTokenCache:
+    """
+    LRU map from a digest of a raw token to the token as validated, so a token
+    sent again is not decoded and verified again. Entries are dropped at the
+    token's `exp`, and the least recently used once VERIFIED_TOKEN_CACHE_SIZE is
+    reached. Only the signature and expiry checks are skipped: revocation is
+    still checked on every request. Lookups are counted in
+    auth_verified_token_cache_lookups_total{result="hit"|"miss"}.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()
+
+    def reset(self):
+        with self._lock:
+            self._tokens = OrderedDict()
+
+    @staticmethod
+    def _key(raw_token):
+        return hashlib.blake2b(raw_token, digest_size=16).digest()
+
+    def get(self, raw_token):
+        key = self._key(raw_token)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._tokens.move_to_end(key)
+                else:
+                    del self._tokens[key]
+                    entry = None
+        increment(TOKEN_CACHE_METRIC, MISS if entry is None else HIT)
+        return entry and entry[0]
+
+    def put(self, raw_token, validated_token):
+        size = settings.VERIFIED_TOKEN_CACHE_SIZE
+        if not size:
+            return
+        with self._lock:
+            self._tokens[self._key(raw_token)] = (validated_token, validated_token['exp'])
+            while len(self._tokens) > size:
+                self._tokens.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+@receiver(setting_changed)
+def reset_verified_tokens(setting, **kwargs):
+    # Tokens were verified with the old keys.
+    if setting in ('SIMPLE_JWT', 'JWT_KEY_FILES'):
+        verified_tokens.reset()
+
+
+class DenylistJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that rejects tokens listed in BlacklistedToken or minted
+    from a revoked refresh token family, answering the common "not revoked" case
+    from memory without a query. Tokens seen before are taken from
+    verified_tokens instead of being verified again.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = verified_tokens.get(raw_token)
+        if validated_token is None:
+            validated_token = super().get_validated_token(raw_token)
+            verified_tokens.put(raw_token, validated_token)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti and token_denylist.is_blacklisted(jti, validated_token['exp']):
+            raise InvalidToken(_('Token is blacklisted'))
+        family = validated_token.get(FAMILY_CLAIM)
+        if family and family in revoked_families:
+            raise InvalidToken(_('Token has been revoked'))
+        return validated_token
+
+
+class TokenVersionCache:
+    """
+    Maps user id -> current CustomUser.token_version.
+
+    Lookups are answered from a per-process dict, then from the Django cache,
+    and only then from the database; both tiers keep entries for
+    TOKEN_VERSION_CACHE_SECONDS. A bump clears this process's dict and the cache
+    entry, so it is seen at once by this process and by the others within that
+    many seconds, provided CACHE_URL is shared. With the default per-process
+    locmem cache, another worker's stale cache entry can add as long again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = {}
+
+    def reset(self):
+        with self._lock:
+            self._local = {}
+
+    @staticmethod
+    def _key(user_id):
+        return f'token_version:{user_id}'
+
+    def get(self, user_id):
+        now = time.monotonic()
+        entry = self._local.get(user_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        version = cache.get(self._key(user_id))
+        if version is None:
+            version = CustomUser.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id).values_list('token_version', flat=True).first()
+            if version is None:
+                return None
+            cache.set(self._key(user_id), version, settings.TOKEN_VERSION_CACHE_SECONDS)
+
+        self._remember({user_id: version}, now)
+        return version
+
+    def get_many(self, user_ids):
+        """
+        Like get() for several users, with one cache round trip and one query for
+        all the misses. Users that do not exist are left out.
+        """
+        now = time.monotonic()
+        versions = {}
+        for user_id in user_ids:
+            entry = self._local.get(user_id)
+            if entry is not None and entry[1] > now:
+                versions[user_id] = entry[0]
+        missing = {user_id for user_id in user_ids if user_id not in versions}
+        if not missing:
+            return versions
+
+        cached = cache.get_many([self._key(user_id) for user_id in missing])
+        found = {user_id: cached[self._key(user_id)] for user_id in missing if self._key(user_id) in cached}
+        missing -= found.keys()
+        if missing:
+            loaded = dict(CustomUser.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=missing).values_list('pk', 'token_version'))
+            cache.set_many(
+                {self._key(user_id): version for user_id, version in loaded.items()},
+                settings.TOKEN_VERSION_CACHE_SECONDS,
+            )
+            found.update(loaded)
+        self._remember(found, now)
+        versions.update(found)
+        return versions
+
+    def _remember(self, versions, now):
+        with self._lock:
+            if len(self._local) + len(versions) > settings.TOKEN_VERSION_CACHE_SIZE:
+                self._local.clear()
+            expires = now + settings.TOKEN_VERSION_CACHE_SECONDS
+            self._local.update((user_id, (version, expires)) for user_id, version in versions.items())
+
+    def forget(self, user_id):
+        cache.delete(self._key(user_id))
+        with self._lock:
+            self._local.pop(user_id, None)
+
+
+token_versions = TokenVersionCache()
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the signed token claims, without a database row.
+    """
+
+    @cached_property
+    def email_verified(self):
+        return self.token.get('email_verified', False)
+
+    @cached_property
+    def role(self):
+        return self.token.get('role')
+
+    @cached_property
+    def token_version(self):
+        return self.token.get(TOKEN_VERSION_CLAIM)
+
+    def has_perm(self, perm, obj=None):
+        return self.is_superuser
+
+    def has_module_perms(self, app_label):
+        return self.is_superuser
+
+
+def check_token_version(token):
+    """
+    Raise AuthenticationFailed if the user's tokens were revoked after this one
+    was issued (password reset, suspension) or the user no longer exists.
+    """
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+    if token.get(TOKEN_VERSION_CLAIM) != token_versions.get(user_id):
+        raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+
+class ClaimsJWTAuthentication(DenylistJWTAuthentication):
+    """
+    Builds request.user from the token claims instead of loading CustomUser.
+    Revocation is enforced through the per-user token version.
+    """
+
+    def get_user(self, validated_token):
+        check_token_version(validated_token)
+        return api_settings.TOKEN_USER_CLASS(validated_token)
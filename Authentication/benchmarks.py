@@ -0,0 +1,272 @@
+"""
+In-process latency benchmark for the Authentication endpoints.
+
+Every scenario drives one endpoint through Django's test client from a pool of
+threads against a freshly seeded throwaway database, and records wall-clock
+latency and SQL queries per request. Password hashing and outbox delivery are
+timed on their own so their share of the endpoint numbers is visible.
+Used by `manage.py bench_auth`.
+"""
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from Auth.querybudget import counted
+
+from .models import CustomUser, OutboundEmail, PendingRegistration
+from .tokens import get_tokens_for_user
+from .utils import drain_email_outbox, hash_token, queue_email
+
+PASSWORD = 'BenchPass123!'
+SCENARIOS = [
+    'register', 'verify-email', 'login', 'token-refresh', 'password-reset', 'password-reset-confirm', 'user-detail',
+]
+# Throttling is off while benchmarking: every request comes from the same client.
+NO_THROTTLE = {scope: None for scope in ('anon', 'user', 'login', 'register', 'password_reset')}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'queries_per_request': round(sum(queries) / count, 2) if count else 0.0,
+    }
+
+
+class Fixtures:
+    """Seeded rows and precomputed inputs, one per request of each scenario."""
+
+    def __init__(self, requests):
+        self.requests = requests
+        password = make_password(PASSWORD)
+        now = timezone.now()
+        self.codes = [uuid.uuid4().hex for _ in range(requests)]
+        self.reset_tokens = [uuid.uuid4().hex for _ in range(requests)]
+
+        users = [
+            CustomUser(
+                email=f'bench-{i}@example.com',
+                password=password,
+                is_active=True,
+                email_verified=True,
+                reset_token=self.reset_tokens[i],
+                reset_token_expires=now + timedelta(hours=1),
+            )
+            for i in range(requests)
+        ]
+        users += [
+            CustomUser(email=f'bench-other-{i}@example.com', password=password, is_active=True, email_verified=True)
+            for i in range(requests)
+        ]
+        CustomUser.objects.bulk_create(users, batch_size=500)
+        PendingRegistration.objects.bulk_create([
+            PendingRegistration(
+                email=f'bench-pending-{i}@example.com',
+                password=password,
+                verification_code=hash_token(self.codes[i]),
+                expiry=now + timedelta(hours=1),
+            )
+            for i in range(requests)
+        ], batch_size=500)
+        verified = CustomUser.objects.filter(email__startswith='bench-', reset_token__isnull=False).order_by('id')
+        self.refresh_tokens = [get_tokens_for_user(user)['refresh'] for user in verified]
+        # A cached admin read: little beyond middleware and token checks.
+        self.admin = CustomUser.objects.create(
+            email='bench-admin@example.com', password=password, is_active=True, email_verified=True, is_staff=True,
+        )
+        self.admin_access = get_tokens_for_user(self.admin)['access']
+
+    def request(self, client, scenario, i):
+        if scenario == 'register':
+            return client.post(reverse('register'), {
+                'email': f'bench-new-{i}@example.com', 'password': PASSWORD, 'password2': PASSWORD,
+            }, content_type='application/json'), 201
+        if scenario == 'verify-email':
+            return client.get(reverse('verify-email'), {'code': self.codes[i]}), 302
+        if scenario == 'login':
+            return client.post(reverse('login'), {
+                'email': f'bench-{i}@example.com', 'password': PASSWORD,
+            }, content_type='application/json'), 200
+        if scenario == 'token-refresh':
+            return client.post(reverse('token_refresh'), {
+                'refresh': self.refresh_tokens[i],
+            }, content_type='application/json'), 200
+        if scenario == 'password-reset':
+            # Not the bench-{i} users: that would replace the tokens seeded for password-reset-confirm.
+            return client.post(reverse('password-reset'), {
+                'email': f'bench-other-{i}@example.com',
+            }, content_type='application/json'), 200
+        if scenario == 'password-reset-confirm':
+            return client.post(reverse('password-reset-confirm'), {
+                'token': self.reset_tokens[i], 'new_password': PASSWORD,
+            }, content_type='application/json'), 200
+        if scenario == 'user-detail':
+            return client.get(
+                reverse('user-detail', kwargs={'id': self.admin.pk}), HTTP_AUTHORIZATION=f'Bearer {self.admin_access}',
+            ), 200
+        raise ValueError(f'Unknown scenario {scenario!r}')
+
+
+def run_scenario(fixtures, scenario, concurrency):
+    latencies = []
+    queries = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(indices):
+        nonlocal errors
+        client = Client()
+        try:
+            for i in indices:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response, expected = fixtures.request(client, scenario, i)
+                    latency = time.perf_counter() - started
+                with lock:
+                    latencies.append(latency)
+                    # Counted as Auth.querybudget does, without BEGIN/COMMIT/SAVEPOINT.
+                    queries.append(sum(counted(query['sql']) for query in captured.captured_queries))
+                    if response.status_code != expected:
+                        errors += 1
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(range(t, fixtures.requests, concurrency),))
+        for t in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, queries, errors, time.perf_counter() - started)
+
+
+def measure_components(samples):
+    """Time password hashing and email delivery on their own."""
+    encoded = None
+    hash_times = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        encoded = make_password(PASSWORD)
+        hash_times.append(time.perf_counter() - started)
+    check_times = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        check_password(PASSWORD, encoded)
+        check_times.append(time.perf_counter() - started)
+
+    OutboundEmail.objects.all().delete()
+    for i in range(samples):
+        queue_email(f'bench-mail-{i}@example.com', 'Benchmark', 'Body')
+    started = time.perf_counter()
+    sent = 0
+    while True:
+        result = drain_email_outbox()
+        if not result['sent']:
+            break
+        sent += result['sent']
+    email_time = time.perf_counter() - started
+
+    hash_times.sort()
+    check_times.sort()
+    return {
+        'hash_p50_ms': round(percentile(hash_times, 50) * 1000, 3),
+        'check_p50_ms': round(percentile(check_times, 50) * 1000, 3),
+        'email_send_ms': round(email_time / sent * 1000, 3) if sent else 0.0,
+    }
+
+
+def run(scenarios=None, requests=100, concurrency=4, component_samples=5):
+    """
+    Create a throwaway database, seed it and run the scenarios. Returns the
+    report as a dict.
+    """
+    scenarios = scenarios or SCENARIOS
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    tmpdir = None
+    if connection.vendor == 'sqlite':
+        # A file rather than the in-memory default, so every thread shares it.
+        tmpdir = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    try:
+        return _run(scenarios, requests, concurrency, component_samples, tmpdir)
+    finally:
+        test_settings['NAME'] = old_test_name
+
+
+def _run(scenarios, requests, concurrency, component_samples, tmpdir):
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    overrides = override_settings(
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': NO_THROTTLE},
+        THROTTLE_STORE_PATH=os.path.join(tmpdir or tempfile.mkdtemp(), 'throttle.sqlite3'),
+    )
+    overrides.enable()
+    try:
+        fixtures = Fixtures(requests)
+        report = {
+            'meta': {
+                'requests': requests,
+                'concurrency': concurrency,
+                'database': connection.vendor,
+                'created_at': timezone.now().isoformat(),
+            },
+            'scenarios': {},
+        }
+        for scenario in scenarios:
+            report['scenarios'][scenario] = run_scenario(fixtures, scenario, concurrency)
+        report['components'] = measure_components(component_samples)
+        return report
+    finally:
+        overrides.disable()
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def compare(report, baseline, threshold):
+    """
+    Compare p95 latency and throughput with a baseline report. Returns a list of
+    (scenario, metric, baseline, current, change_pct, regressed) rows.
+    """
+    rows = []
+    for scenario, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous:
+            continue
+        for metric, higher_is_worse in (('p95_ms', True), ('rps', False), ('queries_per_request', True)):
+            old, new = previous.get(metric), current.get(metric)
+            if not old:
+                continue
+            change = (new - old) / old * 100
+            regressed = change > threshold if higher_is_worse else change < -threshold
+            rows.append((scenario, metric, old, new, round(change, 1), regressed))
+    return rows
@@ -0,0 +1,327 @@
+"""
+Bulk user import from a CSV or NDJSON stream.
+
+Rows are read lazily and sent in batches to a process pool, which validates
+them with ImportUserSerializer and hashes their passwords on every core. The
+parent process checks each batch's emails against the database and inserts the
+valid rows with one bulk_create per batch. Memory use is bounded by the
+batches in flight, not by the size of the import.
+
+Uploads to the API are only staged in BULK_IMPORT_DIR; `manage.py
+import_users --staged` imports them and writes each result next to the upload.
+"""
+import csv
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import CustomUser, OutboundEmail, PendingRegistration
+from .response_cache import invalidate_user_list
+from .serializers import ImportUserSerializer
+from .utils import _verification_email, hash_token
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+DUPLICATE_EMAIL = {'email': ['custom user with this email address already exists.']}
+
+
+def _decode(stream):
+    # Line by line: a newline byte never occurs inside a UTF-8 sequence, so
+    # undecodable bytes only spoil their own line. They are kept as surrogates
+    # and reported by iter_rows.
+    for line in stream:
+        yield line.decode('utf-8', 'surrogateescape')
+
+
+def _undecodable(value):
+    return isinstance(value, str) and any('\udc80' <= char <= '\udcff' for char in value)
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield one dict per row of a binary stream. Rows that cannot be decoded or
+    parsed are yielded as an error message instead.
+    """
+    lines = _decode(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield f'Invalid CSV: {e}.'
+                continue
+            if any(_undecodable(key) or _undecodable(value) for key, value in row.items()):
+                yield 'Invalid UTF-8.'
+                continue
+            # Empty cells count as missing, not as blank values.
+            yield {key: value for key, value in row.items() if key and value}
+    for line in lines:
+        if not line.strip():
+            continue
+        if _undecodable(line):
+            yield 'Invalid UTF-8.'
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield 'Invalid JSON.'
+            continue
+        yield row if isinstance(row, dict) else 'Expected a JSON object.'
+
+
+def _init_worker():
+    # Workers started with spawn/forkserver import Django from scratch.
+    django.setup()
+
+
+def prepare_rows(rows):
+    """
+    Validate and hash a batch of (row number, row) pairs in a worker process.
+    Returns (row number, model fields, errors) triples.
+    """
+    prepared = []
+    for number, row in rows:
+        if isinstance(row, str):
+            prepared.append((number, None, {'non_field_errors': [row]}))
+            continue
+        serializer = ImportUserSerializer(data=row)
+        if not serializer.is_valid():
+            prepared.append((number, None, serializer.errors))
+            continue
+        data = serializer.validated_data
+        prepared.append((number, {
+            'email': CustomUser.objects.normalize_email(data['email']),
+            'password': data.get('password_hash') or make_password(data['password']),
+            'first_name': data.get('first_name', ''),
+            'last_name': data.get('last_name', ''),
+            'phone': data.get('phone', ''),
+        }, None))
+    return prepared
+
+
+class UserImporter:
+    """
+    Inserts prepared batches. Errors go to `on_error(row, errors)` when given,
+    otherwise the first `max_errors` are kept in the result.
+    """
+
+    def __init__(self, verified=False, on_error=None, max_errors=None):
+        self.verified = verified
+        self.on_error = on_error
+        self.max_errors = max_errors
+        self.result = {'created': 0, 'failed': 0, 'errors': []}
+
+    def error(self, row, errors):
+        self.result['failed'] += 1
+        if self.on_error:
+            self.on_error(row, errors)
+        elif self.max_errors is None or len(self.result['errors']) < self.max_errors:
+            self.result['errors'].append({'row': row, 'errors': errors})
+
+    def build(self, number, fields):
+        if self.verified:
+            return number, CustomUser(**fields, is_active=True, email_verified=True), None
+        code = uuid.uuid4().hex
+        pending = PendingRegistration(
+            **fields,
+            verification_code=hash_token(code),
+            expiry=timezone.now() + timedelta(minutes=settings.VERIFICATION_CODE_EXPIRE_MINUTES),
+        )
+        return number, pending, code
+
+    def insert(self, prepared):
+        emails = [fields['email'] for _, fields, _ in prepared if fields]
+        existing = set(CustomUser.objects.filter(email__in=emails).values_list('email', flat=True))
+        if not self.verified:
+            # A live registration holds its email, as on RegisterView.
+            existing.update(PendingRegistration.live().filter(email__in=emails).values_list('email', flat=True))
+        rows = []
+        for number, fields, errors in prepared:
+            if errors:
+                self.error(number, errors)
+            elif fields['email'] in existing:
+                self.error(number, DUPLICATE_EMAIL)
+            else:
+                existing.add(fields['email'])
+                rows.append(self.build(number, fields))
+
+        try:
+            self._save(rows)
+        except IntegrityError:
+            # Someone registered one of these emails since the check: fall back
+            # to one row at a time to find out which.
+            for row in rows:
+                try:
+                    self._save([row])
+                except IntegrityError:
+                    self.error(row[0], DUPLICATE_EMAIL)
+        return self.result
+
+    def _save(self, rows):
+        if not rows:
+            return
+        with transaction.atomic():
+            if self.verified:
+                CustomUser.objects.bulk_create([user for _, user, _ in rows])
+                invalidate_user_list()  # bulk_create sends no post_save
+            else:
+                PendingRegistration.stage([registration for _, registration, _ in rows])
+                OutboundEmail.objects.bulk_create([
+                    OutboundEmail(to_email=to_email, subject=subject, body=body, html_body=html_body)
+                    for to_email, subject, body, html_body in (
+                        _verification_email(registration, code) for _, registration, code in rows
+                    )
+                ])
+        self.result['created'] += len(rows)
+
+
+def _batches(rows, size):
+    numbered = enumerate(rows, start=1)
+    while batch := list(islice(numbered, size)):
+        yield batch
+
+
+def import_users(stream, fmt='csv', verified=False, workers=None, batch_size=None,
+                 on_error=None, max_errors=None, progress=None):
+    """
+    Import every row of `stream`. Unless `verified`, rows are staged as
+    pending registrations with a verification email queued, as on registration. Returns a dict with
+    the created and failed counts and the collected errors.
+    """
+    workers = workers or settings.BULK_IMPORT_WORKERS
+    batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+    importer = UserImporter(verified, on_error, max_errors)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        in_flight = deque()
+        for batch in _batches(iter_rows(stream, fmt), batch_size):
+            in_flight.append(pool.submit(prepare_rows, batch))
+            # Enough to keep every worker busy while the parent inserts.
+            if len(in_flight) >= workers * 2:
+                importer.insert(in_flight.popleft().result())
+                if progress:
+                    progress(importer.result)
+        while in_flight:
+            importer.insert(in_flight.popleft().result())
+            if progress:
+                progress(importer.result)
+    return importer.result
+
+
+def _staged_path(upload_id, suffix):
+    return os.path.join(settings.BULK_IMPORT_DIR, f'{upload_id}.{suffix}')
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def stage_upload(stream, fmt, verified=False):
+    """
+    Copy an uploaded import into BULK_IMPORT_DIR and return its id. The file
+    only appears under its final name once it is complete. Raises
+    UploadTooLarge past BULK_IMPORT_MAX_BYTES.
+    """
+    os.makedirs(settings.BULK_IMPORT_DIR, exist_ok=True)
+    upload_id = uuid.uuid4()
+    partial = _staged_path(upload_id, 'uploading')
+    size = 0
+    try:
+        with open(partial, 'wb') as f:
+            while chunk := stream.read(64 * 1024):
+                size += len(chunk)
+                if size > settings.BULK_IMPORT_MAX_BYTES:
+                    raise UploadTooLarge
+                f.write(chunk)
+    except BaseException:
+        os.remove(partial)
+        raise
+    os.replace(partial, _staged_path(upload_id, f"verified.{fmt}" if verified else fmt))
+    return upload_id
+
+
+def _purge_old_results():
+    cutoff = time.time() - settings.BULK_IMPORT_RESULT_DAYS * 86400
+    for suffix in ('json', 'uploading'):
+        for path in glob.glob(os.path.join(settings.BULK_IMPORT_DIR, f'*.{suffix}')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+
+def import_staged(**kwargs):
+    """
+    Import every staged upload, oldest first, and write each result to
+    `<id>.json`. An upload is claimed by renaming it, so several runners can
+    share the directory. An import that raises gets a result with an `error`
+    instead. Results older than BULK_IMPORT_RESULT_DAYS are removed. Yields
+    (id, result) pairs.
+    """
+    _purge_old_results()
+    staged = []
+    for fmt in FORMATS:
+        for path in glob.glob(os.path.join(settings.BULK_IMPORT_DIR, f'*.{fmt}')):
+            try:
+                staged.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+    for _, path in sorted(staged):
+        upload_id, *flags, fmt = os.path.basename(path).split('.')
+        claimed = _staged_path(upload_id, 'running')
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue  # claimed by another runner
+        # Batches already inserted stay, so a failed result still has their counts.
+        result = {'created': 0, 'failed': 0, 'errors': []}
+        try:
+            with open(claimed, 'rb') as stream:
+                import_users(stream, fmt, verified='verified' in flags,
+                             max_errors=settings.BULK_IMPORT_MAX_ERRORS, progress=result.update, **kwargs)
+        except Exception:
+            logger.exception("Import %s failed", upload_id)
+            result['error'] = 'The import failed; see the server log.'
+        partial = _staged_path(upload_id, 'json.partial')
+        with open(partial, 'w') as f:
+            json.dump(result, f)
+        os.replace(partial, _staged_path(upload_id, 'json'))
+        os.remove(claimed)
+        yield upload_id, result
+
+
+def staged_status(upload_id):
+    """
+    Return the state of a staged upload: 'queued' or 'running', then 'done'
+    or 'failed' with its result. None when there is no such upload.
+    """
+    # Checked in the order an upload moves through, so none is missed mid-move.
+    for fmt in FORMATS:
+        for name in (fmt, f'verified.{fmt}'):
+            if os.path.exists(_staged_path(upload_id, name)):
+                return {'status': 'queued'}
+    if os.path.exists(_staged_path(upload_id, 'running')):
+        return {'status': 'running'}
+    try:
+        with open(_staged_path(upload_id, 'json')) as f:
+            result = json.load(f)
+    except FileNotFoundError:
+        return None
+    return {'status': 'failed' if 'error' in result else 'done', **result}
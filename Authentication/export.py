@@ -0,0 +1,71 @@
+"""
+Constant-memory user export. Rows are read from the database in chunks,
+encoded one by one and (optionally) gzip-compressed on the fly, so the first
+bytes go out before the whole table has been read.
+"""
+import csv
+import json
+import zlib
+
+from .models import CustomUser
+from .serializers import UserSerializer
+
+EXPORT_FIELDS = UserSerializer.Meta.fields
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+WRITE_SIZE = 64 * 1024
+
+
+class _LineBuffer:
+    """File-like object for csv.writer that just hands back what was written."""
+
+    def write(self, value):
+        return value
+
+
+def iter_user_rows(queryset=None, chunk_size=2000):
+    queryset = CustomUser.objects.all() if queryset is None else queryset
+    # iterator() uses a server-side cursor where the backend supports one.
+    return queryset.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+def encode_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=(',', ':')).encode() + b'\n'
+
+def encode_csv(rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+def coalesce(chunks, size=WRITE_SIZE):
+    """Group small per-row chunks into writes of about `size` bytes."""
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_users(fmt='ndjson', compress=False, queryset=None, chunk_size=2000):
+    """Return an iterator of bytes with every user encoded as `fmt`."""
+    encoder = encode_csv if fmt == 'csv' else encode_ndjson
+    stream = coalesce(encoder(iter_user_rows(queryset, chunk_size)))
+    if compress:
+        stream = gzip_stream(stream)
+    return stream
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from Auth.metrics import timer
+
+
+class CalibratedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 whose work factor comes from PASSWORD_HASHER_ITERATIONS (see the
+    calibrate_password_hasher command). Hashes made with another count are
+    upgraded on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHER_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, please retry shortly.'
+    default_code = 'hashing_busy'
+
+
+_pool_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def _get_pool():
+    # Created lazily so every forked worker gets its own threads.
+    global _executor, _slots
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                workers = settings.PASSWORD_HASHING_WORKERS
+                _slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASHING_QUEUE_DEPTH)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor, _slots
+
+
+def submit(fn, *args):
+    """
+    Run a hashing function on the bounded pool. Raises HashingBusy instead of
+    queueing once PASSWORD_HASHING_QUEUE_DEPTH jobs are already waiting.
+    PBKDF2 (hashlib) releases the GIL, so threads use every core.
+    """
+    executor, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda f: slots.release())
+    return future
+
+
+def needs_rehash(encoded):
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferred = hashers.get_hasher('default')
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def hash_password(raw_password):
+    with timer('password'):
+        return submit(hashers.make_password, raw_password).result()
+
+
+def verify_password(raw_password, encoded):
+    with timer('password'):
+        return submit(hashers.check_password, raw_password, encoded).result()
+
+
+def check_user_password(user, raw_password):
+    """
+    Off-thread replacement for `user.check_password`. When the stored hash uses an
+    outdated algorithm or work factor it is replaced, writing only the password column.
+    """
+    if not verify_password(raw_password, user.password):
+        return False
+    if needs_rehash(user.password):
+        user.password = hash_password(raw_password)
+        user.save(update_fields=['password'])
+    return True
+
+
+async def ahash_password(raw_password):
+    with timer('password'):
+        return await asyncio.wrap_future(submit(hashers.make_password, raw_password))
+
+
+async def averify_password(raw_password, encoded):
+    with timer('password'):
+        return await asyncio.wrap_future(submit(hashers.check_password, raw_password, encoded))
+
+
+async def acheck_user_password(user, raw_password):
+    if not await averify_password(raw_password, user.password):
+        return False
+    if needs_rehash(user.password):
+        user.password = await ahash_password(raw_password)
+        await user.asave(update_fields=['password'])
+    return True
@@ -0,0 +1,69 @@
+"""
+Batch token introspection for API gateways.
+
+A gateway sends the access tokens of many inbound requests at once and gets,
+for each, whether it is active and, if so, its claims (RFC 7662 style). The
+signature and `exp` are checked per token in memory; revocation is checked
+for the whole batch together: one BlacklistedToken query for the denylist
+filter's possible hits and one token_version lookup for the users not already
+cached. Tokens of a refresh token family revoked for reuse are rejected from
+memory. Beyond the periodic reloads of those in-process sets, a batch therefore
+costs at most two queries however many tokens it holds.
+"""
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import revoked_families, token_denylist, token_versions
+from .tokens import FAMILY_CLAIM, TOKEN_VERSION_CLAIM
+
+
+def validate(raw_token):
+    """The token's payload, or raise TokenError; as JWTAuthentication.get_validated_token."""
+    error = None
+    for token_class in api_settings.AUTH_TOKEN_CLASSES:
+        try:
+            return token_class(raw_token).payload
+        except TokenError as e:
+            error = e
+    raise error
+
+
+def check(payload, revoked, versions):
+    """The reason a validated token is no longer active, or None; as ClaimsJWTAuthentication."""
+    user_id = payload.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return 'Token contained no recognizable user identification'
+    if payload.get(api_settings.JTI_CLAIM) in revoked:
+        return 'Token is blacklisted'
+    if payload.get(FAMILY_CLAIM) in revoked_families:
+        return 'Token has been revoked'
+    if payload.get(TOKEN_VERSION_CLAIM) != versions.get(user_id):
+        return 'Token has been revoked'
+    return None
+
+
+def introspect(raw_tokens):
+    """One result per token, in order: {'active': True, **claims} or {'active': False, 'error': ...}."""
+    payloads = []
+    errors = []
+    for raw_token in raw_tokens:
+        try:
+            payloads.append(validate(raw_token))
+            errors.append(None)
+        except TokenError as e:
+            payloads.append(None)
+            errors.append(str(e))
+    valid = [payload for payload in payloads if payload is not None]
+
+    revoked = token_denylist.blacklisted(
+        (payload[api_settings.JTI_CLAIM], payload['exp']) for payload in valid if api_settings.JTI_CLAIM in payload
+    )
+    versions = token_versions.get_many(
+        {payload[api_settings.USER_ID_CLAIM] for payload in valid if api_settings.USER_ID_CLAIM in payload}
+    )
+
+    results = []
+    for payload, error in zip(payloads, errors):
+        error = error or check(payload, revoked, versions)
+        results.append({'active': False, 'error': error} if error else {'active': True, **payload})
+    return results
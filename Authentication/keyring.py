@@ -0,0 +1,167 @@
+"""
+Asymmetric JWT signing keys.
+
+JWT_KEY_FILES lists PEM files: RSA (RS256) or Ed25519 (EdDSA) private keys, or
+the public keys of retired signers. The first, which must be private, signs new
+tokens. Every key verifies the tokens whose `kid` header names it; a key's kid
+is its RFC 7638 thumbprint. Keys are parsed once per process. Their public
+halves are served at /.well-known/jwks.json, so other services can verify our
+tokens themselves.
+
+Rotating to a new key:
+1. Append it to JWT_KEY_FILES and deploy. It is published but signs nothing yet.
+2. After JWKS_MAX_AGE, every verifier has it: move it first and deploy.
+3. Replace the old key with its public half; remove it once the last token it
+   signed has expired (REFRESH_TOKEN_LIFETIME).
+
+With JWT_KEY_FILES empty, tokens are signed as configured in SIMPLE_JWT (HS256
+with SECRET_KEY) and the key set is empty.
+"""
+import base64
+import hashlib
+import json
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import condition, require_safe
+from jwt import ExpiredSignatureError, InvalidAlgorithmError, InvalidTokenError
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+from rest_framework_simplejwt import state
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenBackendExpiredToken
+from rest_framework_simplejwt.settings import api_settings
+
+# The members RFC 7638 hashes, per key type.
+THUMBPRINT_MEMBERS = {'RSA': ('e', 'kty', 'n'), 'OKP': ('crv', 'kty', 'x')}
+
+
+class SigningKey:
+
+    def __init__(self, private_key, public_key):
+        if isinstance(public_key, rsa.RSAPublicKey):
+            self.algorithm, self.jwk = 'RS256', RSAAlgorithm.to_jwk(public_key, as_dict=True)
+        elif isinstance(public_key, ed25519.Ed25519PublicKey):
+            self.algorithm, self.jwk = 'EdDSA', OKPAlgorithm.to_jwk(public_key, as_dict=True)
+        else:
+            raise ImproperlyConfigured(f'Unsupported JWT key type {type(public_key).__name__}; use RSA or Ed25519')
+        self.private_key = private_key
+        self.public_key = public_key
+        members = {name: self.jwk[name] for name in THUMBPRINT_MEMBERS[self.jwk['kty']]}
+        digest = hashlib.sha256(json.dumps(members, separators=(',', ':'), sort_keys=True).encode()).digest()
+        self.kid = base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+        self.jwk.update(kid=self.kid, alg=self.algorithm, use='sig')
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f:
+            pem = f.read()
+        if b'PRIVATE KEY' in pem:
+            private_key = serialization.load_pem_private_key(pem, password=None)
+            return cls(private_key, private_key.public_key())
+        return cls(None, serialization.load_pem_public_key(pem))
+
+
+class KeyRing:
+
+    def __init__(self, keys):
+        self.keys = {key.kid: key for key in keys}
+        self.signer = keys[0] if keys else None
+        if self.signer and self.signer.private_key is None:
+            raise ImproperlyConfigured('The first of JWT_KEY_FILES signs tokens and must be a private key')
+        self.jwks = json.dumps({'keys': [key.jwk for key in keys]}, separators=(',', ':')).encode()
+        self.etag = quote_etag(hashlib.sha256(self.jwks).hexdigest())
+
+    @classmethod
+    def from_files(cls, paths):
+        return cls([SigningKey.from_file(path) for path in paths])
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """Signs with the ring's first key and verifies with the key named by `kid`."""
+
+    def __init__(self, ring):
+        super().__init__(
+            ring.signer.algorithm,
+            audience=api_settings.AUDIENCE,
+            issuer=api_settings.ISSUER,
+            leeway=api_settings.LEEWAY,
+            json_encoder=api_settings.JSON_ENCODER,
+        )
+        self.ring = ring
+
+    def encode(self, payload):
+        payload = payload.copy()
+        if self.audience is not None:
+            payload['aud'] = self.audience
+        if self.issuer is not None:
+            payload['iss'] = self.issuer
+        signer = self.ring.signer
+        return jwt.encode(
+            payload, signer.private_key, algorithm=signer.algorithm,
+            headers={'kid': signer.kid}, json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        try:
+            key = self.ring.keys.get(jwt.get_unverified_header(token).get('kid'))
+            if key is None and verify:
+                raise TokenBackendError(_('Token is invalid'))
+            return jwt.decode(
+                token,
+                key.public_key if key else None,
+                algorithms=[key.algorithm] if key else None,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={'verify_aud': self.audience is not None, 'verify_signature': verify},
+            )
+        except InvalidAlgorithmError as ex:
+            raise TokenBackendError(_('Invalid algorithm specified')) from ex
+        except ExpiredSignatureError as ex:
+            raise TokenBackendExpiredToken(_('Token is expired')) from ex
+        except InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid')) from ex
+
+
+_ring = None
+_backend = None
+
+
+def get_key_ring():
+    global _ring
+    if _ring is None:
+        _ring = KeyRing.from_files(settings.JWT_KEY_FILES)
+    return _ring
+
+
+def get_token_backend():
+    global _backend
+    if _backend is None:
+        ring = get_key_ring()
+        _backend = KeyRingTokenBackend(ring) if ring.signer else state.token_backend
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_key_ring(setting, **kwargs):
+    global _ring, _backend
+    if setting == 'JWT_KEY_FILES':
+        _ring = _backend = None
+
+
+@require_safe
+@condition(etag_func=lambda request: get_key_ring().etag)
+def jwks_view(request):
+    response = HttpResponse(get_key_ring().jwks, content_type='application/json')
+    # Verifiers may cache the set this long; see the rotation steps above.
+    patch_cache_control(response, public=True, max_age=settings.JWKS_MAX_AGE)
+    return response
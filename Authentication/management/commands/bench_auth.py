@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Authentication import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every Authentication endpoint in-process against a seeded throwaway database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=benchmarks.SCENARIOS, dest='scenarios',
+                            help='Scenario to run (repeatable). Defaults to all of them.')
+        parser.add_argument('--requests', type=int, default=100, help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Client threads per scenario.')
+        parser.add_argument('--component-samples', type=int, default=5,
+                            help='Samples for the standalone hashing and email timings.')
+        parser.add_argument('--output', '-o', help='Write the JSON report to this file.')
+        parser.add_argument('--baseline', help='JSON report to compare against.')
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help='Percent change counted as a regression when comparing.')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if any metric regressed past --threshold.')
+
+    def handle(self, *args, **options):
+        report = benchmarks.run(
+            scenarios=options['scenarios'],
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            component_samples=options['component_samples'],
+        )
+
+        self.stdout.write(f"{'scenario':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}{'errors':>8}")
+        for name, result in report['scenarios'].items():
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                f"{result['rps']:>10.1f}{result['queries_per_request']:>9.1f}{result['errors']:>8}"
+            )
+        components = report['components']
+        self.stdout.write(
+            f"hash {components['hash_p50_ms']:.1f} ms, check {components['check_p50_ms']:.1f} ms, "
+            f"email send {components['email_send_ms']:.2f} ms (p50 / mean)"
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            rows = benchmarks.compare(report, baseline, options['threshold'])
+            regressions = [row for row in rows if row[5]]
+            for scenario, metric, old, new, change, regressed in rows:
+                marker = '  REGRESSION' if regressed else ''
+                self.stdout.write(f"{scenario:<24}{metric:<20}{old:>10}{new:>10}{change:>+8.1f}%{marker}")
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} metric(s) regressed by more than {options['threshold']}%")
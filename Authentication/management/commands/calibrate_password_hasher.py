@@ -0,0 +1,43 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+
+PROBE_ITERATIONS = 100_000
+ROUND_TO = 10_000
+
+
+class Command(BaseCommand):
+    help = 'Pick a PBKDF2 iteration count that hashes in the target time on this host.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250.0,
+                            help='Desired time for one password hash, in milliseconds.')
+        parser.add_argument('--samples', type=int, default=5)
+        # Below Django's default, must_update would rehash existing passwords down on login.
+        parser.add_argument('--min-iterations', type=int, default=PBKDF2PasswordHasher.iterations,
+                            help="Never recommend fewer iterations than this (default: Django's PBKDF2 default).")
+
+    def handle(self, *args, **options):
+        hasher = PBKDF2PasswordHasher()
+        salt = hasher.salt()
+        timings = []
+        for _ in range(options['samples']):
+            started = time.perf_counter()
+            hasher.encode('calibration-password', salt, iterations=PROBE_ITERATIONS)
+            timings.append(time.perf_counter() - started)
+
+        per_iteration = statistics.median(timings) / PROBE_ITERATIONS
+        iterations = int(options['target_ms'] / 1000 / per_iteration)
+        iterations = max(round(iterations / ROUND_TO) * ROUND_TO, ROUND_TO)
+        if iterations < options['min_iterations']:
+            self.stderr.write(
+                f"{iterations} iterations would meet the target but is below the floor; "
+                f"using {options['min_iterations']}."
+            )
+            iterations = options['min_iterations']
+
+        expected_ms = iterations * per_iteration * 1000
+        self.stdout.write(f"Measured {per_iteration * 1e9:.1f} ns per iteration.")
+        self.stdout.write(f"PASSWORD_HASHER_ITERATIONS={iterations}  (~{expected_ms:.0f} ms per hash)")
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from Auth.routers import replica_reads
+from Authentication.export import FORMATS, export_users
+
+
+class Command(BaseCommand):
+    help = 'Stream every user as NDJSON or CSV to a file or stdout, in constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output.')
+        parser.add_argument('--output', '-o', help='File to write to (default: stdout).')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database per round trip.')
+
+    def handle(self, *args, **options):
+        with replica_reads():
+            self.write(export_users(options['format'], options['gzip'], chunk_size=options['chunk_size']), options)
+
+    def write(self, stream, options):
+        if options['output']:
+            with open(options['output'], 'wb') as out:
+                for chunk in stream:
+                    out.write(chunk)
+        else:
+            out = sys.stdout.buffer
+            for chunk in stream:
+                out.write(chunk)
+            out.flush()
@@ -0,0 +1,25 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Auth.schema import generate_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema once, e.g. at build time, for the docs to serve as is.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o',
+                            help='File to write to (default: OPENAPI_SCHEMA_FILE, else stdout).')
+
+    def handle(self, *args, **options):
+        schema = generate_schema()
+        output = options['output'] or settings.OPENAPI_SCHEMA_FILE
+        if output:
+            with open(output, 'wb') as out:
+                out.write(schema)
+            self.stdout.write(f'Wrote the OpenAPI schema to {output}')
+        else:
+            sys.stdout.buffer.write(schema)
+            sys.stdout.flush()
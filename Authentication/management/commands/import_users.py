@@ -0,0 +1,72 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Authentication.bulk_import import FORMATS, import_staged, import_users
+
+
+class Command(BaseCommand):
+    help = 'Import users from a CSV or NDJSON file (or stdin), validating and hashing on every core.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="File to read, or '-' for stdin.")
+        parser.add_argument('--staged', action='store_true',
+                            help='Import the uploads staged by the API in BULK_IMPORT_DIR instead of a file.')
+        parser.add_argument('--loop', action='store_true', help='Keep importing staged uploads until interrupted.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is staged (with --staged --loop).')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: from the file extension, else csv).')
+        parser.add_argument('--verified', action='store_true',
+                            help='Create active, verified users instead of queueing verification emails.')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: BULK_IMPORT_WORKERS).')
+        parser.add_argument('--batch-size', type=int, help='Rows per batch (default: BULK_IMPORT_BATCH_SIZE).')
+        parser.add_argument('--errors', help='Write row errors to this file as NDJSON (default: stderr).')
+
+    def handle(self, *args, **options):
+        if options['staged']:
+            return self.handle_staged(options)
+        path = options['path']
+        if path is None:
+            raise CommandError('Give a file to import, or --staged.')
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        errors_out = open(options['errors'], 'w') if options['errors'] else self.stderr
+
+        def on_error(row, errors):
+            errors_out.write(json.dumps({'row': row, 'errors': errors}) + '\n')
+
+        def progress(result):
+            self.stdout.write(f"{result['created']} created, {result['failed']} failed")
+
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            result = import_users(
+                stream, fmt,
+                verified=options['verified'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                on_error=on_error,
+                progress=progress if options['verbosity'] > 1 else None,
+            )
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+            if options['errors']:
+                errors_out.close()
+        self.stdout.write(self.style.SUCCESS(f"Imported {result['created']} users, {result['failed']} rows failed"))
+
+    def handle_staged(self, options):
+        while True:
+            imported = 0
+            for upload_id, result in import_staged(workers=options['workers'], batch_size=options['batch_size']):
+                imported += 1
+                self.stdout.write(f"{upload_id}: {result['created']} created, {result['failed']} failed")
+            if not options['loop']:
+                break
+            if not imported:
+                time.sleep(options['interval'])
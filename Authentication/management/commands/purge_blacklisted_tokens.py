@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Authentication.models import BlacklistedToken, RefreshTokenFamily
+from Authentication.utils import iter_pk_batches
+
+
+class Command(BaseCommand):
+    help = 'Delete BlacklistedToken and RefreshTokenFamily rows whose token has already expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows deleted per statement; small batches keep lock times short.')
+        parser.add_argument('--sleep', type=float, default=0.05,
+                            help='Seconds to pause between batches.')
+        parser.add_argument('--loop', action='store_true', help='Keep purging periodically until interrupted.')
+        parser.add_argument('--interval', type=float, default=3600.0,
+                            help='Seconds between purges (with --loop).')
+
+    def handle(self, *args, **options):
+        while True:
+            self.purge(BlacklistedToken, 'blacklisted tokens', options['batch_size'], options['sleep'])
+            self.purge(RefreshTokenFamily, 'refresh token families', options['batch_size'], options['sleep'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def purge(self, model, label, batch_size, pause):
+        started = time.monotonic()
+        expired = model.objects.filter(expires_at__lte=timezone.now())
+        total = 0
+        for pks in iter_pk_batches(expired, batch_size):
+            deleted, _ = model.objects.filter(pk__in=pks).delete()
+            total += deleted
+            if pause:
+                time.sleep(pause)
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0.0
+        self.stdout.write(f"Deleted {total} expired {label} in {elapsed:.2f}s ({rate:.0f} rows/sec).")
+        return total
@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Authentication.models import OutboundEmail
+from Authentication.utils import iter_pk_batches
+
+
+class Command(BaseCommand):
+    help = 'Delete SENT and FAILED outbox emails older than EMAIL_OUTBOX_RETENTION_DAYS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.EMAIL_OUTBOX_RETENTION_DAYS,
+                            help='Keep emails created within this many days.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows deleted per statement; small batches keep lock times short.')
+        parser.add_argument('--sleep', type=float, default=0.05,
+                            help='Seconds to pause between batches.')
+
+    def handle(self, *args, **options):
+        done = OutboundEmail.objects.filter(
+            status__in=[OutboundEmail.Status.SENT, OutboundEmail.Status.FAILED],
+            created_at__lt=timezone.now() - timedelta(days=options['days']),
+        )
+        total = 0
+        for pks in iter_pk_batches(done, options['batch_size']):
+            total += OutboundEmail.objects.filter(pk__in=pks).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(f"Deleted {total} sent or failed emails.")
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Authentication.models import PendingRegistration
+from Authentication.utils import iter_pk_batches
+
+
+class Command(BaseCommand):
+    help = 'Delete expired pending registrations in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches to let other writers in.')
+
+    def handle(self, *args, **options):
+        expired = PendingRegistration.objects.filter(expiry__lte=timezone.now())
+        total = 0
+        for pks in iter_pk_batches(expired, options['batch_size']):
+            total += PendingRegistration.objects.filter(pk__in=pks).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(f"Deleted {total} expired pending registrations.")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Authentication.models import CustomUser
+from Authentication.utils import iter_pk_batches
+
+
+class Command(BaseCommand):
+    help = 'Clear expired email verification codes in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches to let other writers in.')
+
+    def handle(self, *args, **options):
+        expired = CustomUser.objects.filter(verification_code_expiry__lt=timezone.now())
+        total = 0
+        for pks in iter_pk_batches(expired, options['batch_size']):
+            total += CustomUser.objects.filter(pk__in=pks).update(
+                verification_code=None,
+                verification_code_expiry=None,
+            )
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(f"Cleared {total} expired verification codes.")
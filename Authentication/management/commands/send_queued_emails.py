@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Authentication.utils import drain_email_outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails from the outbox, one SMTP connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep draining until interrupted.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the outbox is empty (with --loop).')
+
+    def handle(self, *args, **options):
+        while True:
+            result = drain_email_outbox(batch_size=options['batch_size'])
+            if any(result.values()):
+                self.stdout.write(
+                    f"sent={result['sent']} retried={result['retried']} failed={result['failed']}"
+                )
+            if not options['loop']:
+                break
+            # A full batch means there is probably more waiting, so go again immediately.
+            if sum(result.values()) < options['batch_size']:
+                time.sleep(options['interval'])
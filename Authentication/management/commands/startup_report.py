@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Auth import startup
+
+
+class Command(BaseCommand):
+    help = (
+        'Report the import time per package or module and the resident memory of a freshly started '
+        'worker. Pick the settings profile with --settings, e.g. --settings Auth.settings_api.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modules', action='store_true',
+                            help='List single modules by their own import time instead of packages.')
+        parser.add_argument('--top', type=int, default=20, help='Rows to list.')
+        parser.add_argument('--output', '-o', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            report = startup.profile(settings.SETTINGS_MODULE)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{report['settings']}: loaded in {report['load_ms']:.0f} ms, {len(report['modules'])} modules "
+            f"imported in {report['import_ms']:.0f} ms, RSS {report['rss_kb'] / 1024:.1f} MiB"
+        )
+        if options['modules']:
+            rows = sorted(((name, own) for name, own, _ in report['modules']), key=lambda row: row[1], reverse=True)
+        else:
+            rows = startup.by_package(report['modules'])
+        for name, own in rows[:options['top']]:
+            self.stdout.write(f"{own / 1000:>10.1f} ms  {name}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
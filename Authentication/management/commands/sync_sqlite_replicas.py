@@ -0,0 +1,33 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto every SQLite read replica (local testing of the replica router).'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The primary database is not SQLite.')
+        replicas = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if settings.DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3'
+        ]
+        if not replicas:
+            raise CommandError('No SQLite replicas configured (see REPLICA_DATABASE_URLS).')
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in replicas:
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    # Online backup: a consistent copy even while the primary is in use.
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"Copied {primary['NAME']} to {alias} ({settings.DATABASES[alias]['NAME']})")
+        finally:
+            source.close()
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:42
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_codes(apps, schema_editor):
+    CustomUser = apps.get_model('Authentication', 'CustomUser')
+    # Blank strings would collide on the unique index; NULLs do not.
+    CustomUser.objects.filter(verification_code='').update(verification_code=None)
+    pending = CustomUser.objects.filter(verification_code__isnull=False)
+    for user in pending.only('id', 'verification_code').iterator():
+        if len(user.verification_code) == 64:
+            continue
+        digest = hashlib.sha256(user.verification_code.encode()).hexdigest()
+        CustomUser.objects.filter(pk=user.pk).update(verification_code=digest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0010_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='verification_code',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(hash_existing_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customuser',
+            name='verification_code',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='verification_code_expiry',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
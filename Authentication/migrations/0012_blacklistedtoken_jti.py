@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:43
+
+import jwt
+from django.db import migrations, models
+
+
+def backfill_jti(apps, schema_editor):
+    BlacklistedToken = apps.get_model('Authentication', 'BlacklistedToken')
+    for row in BlacklistedToken.objects.filter(jti='').only('id', 'token').iterator():
+        try:
+            claims = jwt.decode(row.token, options={'verify_signature': False})
+        except jwt.InvalidTokenError:
+            continue
+        if claims.get('jti'):
+            BlacklistedToken.objects.filter(pk=row.pk).update(jti=claims['jti'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0011_hash_verification_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blacklistedtoken',
+            name='jti',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.RunPython(backfill_jti, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:45
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def drop_unusable_rows(apps, schema_editor):
+    BlacklistedToken = apps.get_model('Authentication', 'BlacklistedToken')
+    # Rows whose jti could not be recovered can never match a lookup.
+    BlacklistedToken.objects.filter(jti='').delete()
+    duplicates = (
+        BlacklistedToken.objects.values('jti')
+        .annotate(keep=Min('id'), count=models.Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        BlacklistedToken.objects.filter(jti=row['jti']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0012_blacklistedtoken_jti'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_unusable_rows, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='blacklistedtoken',
+            name='token',
+        ),
+        migrations.RemoveField(
+            model_name='blacklistedtoken',
+            name='user',
+        ),
+        migrations.AlterField(
+            model_name='blacklistedtoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='blacklistedtoken',
+            name='jti',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+    ]
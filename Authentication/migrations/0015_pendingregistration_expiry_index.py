@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0014_customuser_token_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pendingregistration',
+            name='expiry',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0015_pendingregistration_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshTokenFamily',
+            fields=[
+                ('family', models.UUIDField(primary_key=True, serialize=False)),
+                ('jti', models.CharField(max_length=64)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('revoked_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0016_refreshtokenfamily'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='role',
+            field=models.CharField(choices=[('ADMIN', 'Admin'), ('USER', 'User'), ('MANAGER', 'Manager'), ('GATEWAY', 'Gateway')], default='USER', max_length=10),
+        ),
+    ]
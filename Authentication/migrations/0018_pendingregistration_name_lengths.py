@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:31
+
+from django.db import migrations, models
+from django.db.models.functions import Length, Substr
+
+
+def truncate_long_names(apps, schema_editor):
+    PendingRegistration = apps.get_model('Authentication', 'PendingRegistration')
+    # CustomUser only holds 30 characters, so longer names could never be promoted anyway.
+    for name in ('first_name', 'last_name'):
+        PendingRegistration.objects.annotate(length=Length(name)).filter(length__gt=30).update(
+            **{name: Substr(name, 1, 30)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Authentication', '0017_customuser_gateway_role'),
+    ]
+
+    operations = [
+        migrations.RunPython(truncate_long_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='pendingregistration',
+            name='first_name',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='pendingregistration',
+            name='last_name',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+    ]
@@ -1,9 +1,12 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import AbstractBaseUser
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 from django.contrib.auth.models import BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
+from .hashers import hash_password
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         """
@@ -16,7 +19,7 @@ class UserManager(BaseUserManager):
 
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
+        user.password = hash_password(password)
         user.save(using=self._db)
         return user
     
@@ -42,6 +45,7 @@ class CustomUser(AbstractBaseUser):
         ADMIN = 'ADMIN', 'Admin'
         USER = 'USER', 'User'
         MANAGER = 'MANAGER', 'Manager'
+        GATEWAY = 'GATEWAY', 'Gateway'  # service accounts that introspect tokens
 
     class Status(models.TextChoices):
         ACTIVE = 'ACTIVE', 'Active'
@@ -55,8 +59,9 @@ class CustomUser(AbstractBaseUser):
     phone = models.CharField(max_length=20, blank=True)
     role = models.CharField(max_length=10, choices=Role.choices, default=Role.USER)
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.INACTIVE)
-    verification_code = models.CharField(max_length=32, blank=True, null=True)
-    verification_code_expiry = models.DateTimeField(blank=True, null=True)
+    # SHA-256 hex digest of the code sent by email, never the code itself.
+    verification_code = models.CharField(max_length=64, unique=True, blank=True, null=True)
+    verification_code_expiry = models.DateTimeField(blank=True, null=True, db_index=True)
     email_verified = models.BooleanField(default=False)
 
     # Add these fields for compatibility with Django's admin and permissions system
@@ -66,13 +71,52 @@ class CustomUser(AbstractBaseUser):
 
     reset_token = models.CharField(max_length=32, blank=True, null=True)
     reset_token_expires = models.DateTimeField(blank=True, null=True)
+    # Copied into every JWT; bumping it revokes all tokens issued before.
+    token_version = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
+    # Copied into the JWTs (see AuthRefreshToken.for_user), which are not re-read
+    # from the row: changing one through save() revokes the user's tokens.
+    # QuerySet.update() does not; call revoke_tokens() after one.
+    TOKEN_CLAIM_FIELDS = ('role', 'is_staff', 'is_superuser', 'is_active', 'email_verified')
+
     objects = UserManager()
 
-    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_claims = instance._claims()
+        return instance
+
+    def _claims(self):
+        # Deferred fields are left out rather than loaded.
+        return {name: self.__dict__[name] for name in self.TOKEN_CLAIM_FIELDS if name in self.__dict__}
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            # Only revoke_tokens() writes token_version: a full save of an
+            # instance loaded before a revocation would otherwise undo it.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'token_version' and field.attname not in deferred
+            ]
+        loaded = getattr(self, '_loaded_claims', None)
+        update_fields = kwargs.get('update_fields')
+        saved = {
+            name: value for name, value in self._claims().items() if update_fields is None or name in update_fields
+        }
+        changed = loaded is not None and not self._state.adding and any(
+            name in loaded and loaded[name] != value for name, value in saved.items()
+        )
+        super().save(*args, **kwargs)
+        self._loaded_claims = {**(loaded or {}), **saved}
+        if changed:
+            self.revoke_tokens()
+
     def __str__(self):
         return f"{self.email} ({self.get_role_display()})"
     
@@ -83,15 +127,221 @@ class CustomUser(AbstractBaseUser):
     def has_module_perms(self, app_label):
         """Does the user have permissions to view the app `app_label`?"""
         return self.is_superuser
+
+    def _revoke_values(self, update_fields):
+        values = {name: getattr(self, name) for name in update_fields}
+        values['token_version'] = models.F('token_version') + 1
+        # Not re-read: if another request revoked concurrently this lags behind,
+        # and tokens minted from it are rejected rather than wrongly accepted.
+        self.token_version += 1
+        return values
+
+    def revoke_tokens(self, update_fields=()):
+        """
+        Invalidate every JWT issued to this user so far. The fields named in
+        `update_fields` are written in the same UPDATE.
+        """
+        from .authentication import token_versions
+
+        CustomUser.objects.filter(pk=self.pk).update(**self._revoke_values(update_fields))
+        token_versions.forget(self.pk)
+        self._updated(update_fields)
+
+    async def arevoke_tokens(self, update_fields=()):
+        from .authentication import token_versions
+
+        await CustomUser.objects.filter(pk=self.pk).aupdate(**self._revoke_values(update_fields))
+        token_versions.forget(self.pk)
+        # transaction.on_commit() may not be called from the event loop.
+        await sync_to_async(self._updated)(update_fields)
+
+    def _updated(self, update_fields):
+        # QuerySet.update() sends no post_save, so do what the signal handler would.
+        from .response_cache import USER_FIELDS, invalidate_user
+
+        if not USER_FIELDS.isdisjoint(update_fields):
+            invalidate_user(self.pk)
+
+    @property
+    def can_log_in(self):
+        """False for deactivated or suspended accounts, which get no new tokens."""
+        return self.is_active and self.status != self.Status.SUSPENDED
+
+    def suspend(self):
+        """Suspend the account and revoke its outstanding tokens."""
+        self.status = self.Status.SUSPENDED
+        self.revoke_tokens(update_fields=['status'])
   
 class BlacklistedToken(models.Model):
-    token = models.CharField(max_length=500, db_index=True)
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    expires_at = models.DateTimeField()
+    # Only the token id is kept; rows are purged once the token has expired
+    # (see the purge_blacklisted_tokens command).
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @classmethod
+    def is_token_blacklisted(cls, jti):
+        """
+        Check if the token with this `jti` is blacklisted. Read from the primary,
+        like the rest of the revocation data.
+        """
+        return cls.objects.using(DEFAULT_DB_ALIAS).filter(jti=jti).exists()
+
+    @classmethod
+    def blacklist(cls, token):
+        """
+        Blacklist a validated simplejwt token and make this process see it at once.
+        Other processes pick it up on their next denylist refresh.
+        """
+        from rest_framework_simplejwt.settings import api_settings
+        from rest_framework_simplejwt.utils import datetime_from_epoch
+        from .authentication import token_denylist
+
+        entry, _ = cls.objects.get_or_create(
+            jti=token[api_settings.JTI_CLAIM],
+            defaults={'expires_at': datetime_from_epoch(token['exp'])},
+        )
+        token_denylist.add(entry.jti, token['exp'])
+        return entry
+
+class RefreshTokenFamily(models.Model):
+    # One row per login. The refresh tokens rotated from it form its family and
+    # only the latest, `jti`, may be used: presenting an older one means it was
+    # replayed, and the whole family is revoked. Rows are purged once expired
+    # (see the purge_blacklisted_tokens command).
+    family = models.UUIDField(primary_key=True)
+    jti = models.CharField(max_length=64)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    @classmethod
+    def start(cls, family, jti, expires_at):
+        return cls.objects.create(family=family, jti=jti, expires_at=expires_at)
+
+    @classmethod
+    async def astart(cls, family, jti, expires_at):
+        return await cls.objects.acreate(family=family, jti=jti, expires_at=expires_at)
 
     @classmethod
-    def is_token_blacklisted(cls, token):
+    def rotate(cls, family, jti, new_jti, expires_at):
         """
-        Check if the token is blacklisted.
+        Replace the family's current `jti` with `new_jti` in one UPDATE, if `jti`
+        still is the current one and the family is live. Returns whether it was.
         """
-        return cls.objects.filter(token=token).exists()
+        return cls.objects.filter(
+            family=family, jti=jti, revoked_at__isnull=True, expires_at__gt=timezone.now(),
+        ).update(jti=new_jti, expires_at=expires_at) == 1
+
+    @classmethod
+    def revoke(cls, family):
+        """
+        Revoke a family and make this process reject its access tokens at once.
+        Other processes pick it up on their next refresh of revoked_families.
+        """
+        from .authentication import revoked_families
+
+        cls.objects.filter(family=family, revoked_at__isnull=True).update(revoked_at=timezone.now())
+        revoked_families.add(family)
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting in, or delivered from, the outbox. The bodies carry live
+    verification codes and reset links, so they are blanked once the row is
+    SENT or FAILED; the purge_outbound_emails command deletes such rows after
+    EMAIL_OUTBOX_RETENTION_DAYS.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        SENDING = 'SENDING', 'Sending'
+        SENT = 'SENT', 'Sent'
+        FAILED = 'FAILED', 'Failed'
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+
+class PendingRegistration(models.Model):
+    """
+    A signup waiting for email verification. Kept out of CustomUser so that
+    abandoned and bot registrations never reach the user table; VerifyEmailView
+    promotes the row, the purge_pending_registrations command drops expired ones.
+    """
+    email = models.EmailField(unique=True)
+    password = models.CharField(max_length=128)  # already hashed
+    # As long as on CustomUser, so that promote() can always copy them.
+    first_name = models.CharField(max_length=CustomUser._meta.get_field('first_name').max_length, blank=True)
+    last_name = models.CharField(max_length=CustomUser._meta.get_field('last_name').max_length, blank=True)
+    phone = models.CharField(max_length=CustomUser._meta.get_field('phone').max_length, blank=True)
+    # SHA-256 hex digest of the code sent by email, as for CustomUser.
+    verification_code = models.CharField(max_length=64, unique=True)
+    expiry = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    UPSERT_FIELDS = ['password', 'first_name', 'last_name', 'phone', 'verification_code', 'expiry', 'created_at']
+
+    def __str__(self):
+        return self.email
+
+    @classmethod
+    def live(cls):
+        return cls.objects.filter(expiry__gt=timezone.now())
+
+    @classmethod
+    def stage(cls, registrations):
+        """
+        Insert registrations in one statement, replacing any earlier (expired)
+        registration for the same email.
+        """
+        return cls.objects.bulk_create(
+            registrations, update_conflicts=True, unique_fields=['email'], update_fields=cls.UPSERT_FIELDS,
+        )
+
+    @classmethod
+    async def astage(cls, registrations):
+        return await cls.objects.abulk_create(
+            registrations, update_conflicts=True, unique_fields=['email'], update_fields=cls.UPSERT_FIELDS,
+        )
+
+    def _user(self):
+        return CustomUser(
+            email=self.email,
+            password=self.password,
+            first_name=self.first_name,
+            last_name=self.last_name,
+            phone=self.phone,
+            is_active=True,
+            email_verified=True,
+        )
+
+    def promote(self):
+        """
+        Create the verified CustomUser and drop this row. Raises IntegrityError
+        if the email already belongs to a user.
+        """
+        user = self._user()
+        with transaction.atomic():
+            user.save(force_insert=True)
+            PendingRegistration.objects.filter(pk=self.pk).delete()
+        return user
+
+    async def apromote(self):
+        # The async ORM has no transactions: run both statements in one thread.
+        return await sync_to_async(self.promote)()
@@ -0,0 +1,55 @@
+"""
+Cache keys for the admin user endpoints and their invalidation.
+
+A user's detail response is keyed by id and deleted when the user changes.
+List pages are keyed by URL under a generation number that any change to any
+user bumps, since one change can shift every page after it.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from Auth.caching import note_write
+
+from .serializers import UserSerializer
+
+USER_FIELDS = frozenset(UserSerializer.Meta.fields)
+LIST_GENERATION_KEY = 'user_list:generation'
+
+
+def user_detail_key(pk):
+    return f'user_detail:{pk}'
+
+
+def user_list_key(request):
+    # Seeded from the clock so that an evicted counter never restarts at a
+    # generation whose pages are still cached.
+    generation = cache.get_or_set(LIST_GENERATION_KEY, time.time_ns, None)
+    url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f'user_list:{generation}:{url}'
+
+
+def _bump_list_generation():
+    note_write()
+    try:
+        cache.incr(LIST_GENERATION_KEY)
+    except ValueError:
+        cache.set(LIST_GENERATION_KEY, time.time_ns(), None)
+
+
+def _delete_user(pk):
+    cache.delete(user_detail_key(pk))
+    _bump_list_generation()
+
+
+def invalidate_user_list():
+    _bump_list_generation()
+    # Again after commit: a read in between may have cached the old rows.
+    transaction.on_commit(_bump_list_generation)
+
+
+def invalidate_user(pk):
+    _delete_user(pk)
+    transaction.on_commit(lambda: _delete_user(pk))
@@ -1,6 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
+from django.contrib.auth.hashers import identify_hasher
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import CustomUser
+from .tokens import AuthRefreshToken
 
 class BaseSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(read_only=True)
@@ -25,14 +30,49 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password2')
-        user = CustomUser.objects.create_user(
-            email=validated_data['email'],
-            password=validated_data['password'],
-            first_name=validated_data.get('first_name', ''),
-            last_name=validated_data.get('last_name', ''),
-            phone=validated_data.get('phone', ''),
-        )
-        return user
+        email = validated_data.pop('email')
+        password = validated_data.pop('password')
+        return CustomUser.objects.create_user(email=email, password=password, **validated_data)
+
+class AsyncRegisterSerializer(RegisterSerializer):
+    """
+    RegisterSerializer without the email UniqueValidator, whose sync query cannot
+    run on the event loop. AsyncRegisterView checks uniqueness with the async ORM.
+    """
+
+    class Meta(RegisterSerializer.Meta):
+        extra_kwargs = {'email': {'validators': []}}
+
+class ImportUserSerializer(RegisterSerializer):
+    """
+    One row of a bulk import. Same rules as registration, except that email
+    uniqueness is checked per batch by the importer, password2 is optional and
+    a row may carry an existing Django-format `password_hash` instead of a
+    password.
+    """
+    password = serializers.CharField(write_only=True, required=False, validators=[validate_password])
+    password2 = serializers.CharField(write_only=True, required=False)
+    password_hash = serializers.CharField(write_only=True, required=False)
+
+    class Meta(RegisterSerializer.Meta):
+        fields = RegisterSerializer.Meta.fields + ['password_hash']
+        extra_kwargs = {'email': {'validators': []}}
+
+    def validate_password_hash(self, value):
+        try:
+            identify_hasher(value)
+        except ValueError:
+            raise serializers.ValidationError("Unknown password hash format.")
+        return value
+
+    def validate(self, attrs):
+        if 'password_hash' in attrs:
+            return attrs
+        if 'password' not in attrs:
+            raise serializers.ValidationError({"password": "This field is required."})
+        if attrs.get('password2', attrs['password']) != attrs['password']:
+            raise serializers.ValidationError({"password": "Password fields didn't match."})
+        return attrs
 
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -49,3 +89,29 @@ class PasswordResetSerializer(serializers.Serializer):
 class PasswordResetConfirmSerializer(serializers.Serializer):
     new_password = serializers.CharField(required=True, validators=[validate_password])
     token = serializers.CharField(required=True)
+
+class TokenIntrospectionSerializer(serializers.Serializer):
+    tokens = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+
+    def validate_tokens(self, tokens):
+        if len(tokens) > settings.TOKEN_INTROSPECTION_MAX_BATCH:
+            raise serializers.ValidationError(f"At most {settings.TOKEN_INTROSPECTION_MAX_BATCH} tokens per request.")
+        return tokens
+
+class VersionedTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that rejects tokens revoked through CustomUser.token_version instead of
+    loading the user row, and rotates refresh tokens within their family.
+    """
+    token_class = AuthRefreshToken
+
+    def validate(self, attrs):
+        from .authentication import check_token_version
+
+        refresh = self.token_class(attrs['refresh'])
+        check_token_version(refresh)
+
+        if not api_settings.ROTATE_REFRESH_TOKENS:
+            return {'access': str(refresh.access_token)}
+        refresh.rotate()
+        return {'access': str(refresh.access_token), 'refresh': str(refresh)}
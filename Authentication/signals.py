@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .response_cache import USER_FIELDS, invalidate_user
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and USER_FIELDS.isdisjoint(update_fields):
+        # e.g. a password rehash: nothing the cached responses show.
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
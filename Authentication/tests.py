@@ -1,9 +1,92 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import BytesIO, StringIO
+from smtplib import SMTPException
+from unittest import mock
+
+import jwt
+from asgiref.sync import iscoroutinefunction
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
-from .models import CustomUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from Auth import metrics, routers, schema, startup
+from Auth.base import AsyncAPIView
+from Auth.log import BoundedQueueHandler, JSONFormatter, SamplingFilter
+from Auth.querybudget import QueryBudgetExceeded, QueryBudgetTestMixin
+from Auth.throttling import SlidingWindowStore, get_store
+from . import benchmarks, bulk_import, hashers
+from .async_views import (
+    AsyncLoginView,
+    AsyncPasswordResetConfirmView,
+    AsyncPasswordResetView,
+    AsyncRegisterView,
+    AsyncVerifyEmailView,
+)
+from .authentication import (
+    ClaimsJWTAuthentication,
+    DenylistJWTAuthentication,
+    revoked_families,
+    token_denylist,
+    token_versions,
+    verified_tokens,
+)
+from .hashers import hash_password, needs_rehash
+from .introspection import introspect
+from .models import BlacklistedToken, CustomUser, OutboundEmail, PendingRegistration, RefreshTokenFamily
+from .serializers import UserSerializer
+from .tokens import FAMILY_CLAIM, AuthAccessToken, AuthRefreshToken, get_tokens_for_user
+from .views import (
+    LoginView,
+    PasswordResetConfirmView,
+    PasswordResetView,
+    RegisterView,
+    TokenIntrospectView,
+    TokenRefreshView,
+    UserListAPIView,
+    VerifyEmailView,
+)
+from .utils import _claim_outbox_batch, drain_email_outbox, hash_token, queue_email
+
+# Replica aliases mirror the test database but through their own connections,
+# which cannot see data inside a test's transaction; tests read the primary.
+@override_settings(THROTTLE_STORE_PATH=os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3'), DATABASE_REPLICAS=[])
+class AuthTestCase(APITestCase):
+    """Resets the process-wide caches and throttle counters between tests."""
+
+    def setUp(self):
+        super().setUp()
+        get_store().clear()
+        token_denylist.reset()
+        token_versions.reset()
+        verified_tokens.reset()
+        revoked_families.reset()
+        cache.clear()
+
 
-class AuthTests(APITestCase):
+class AuthTests(AuthTestCase):
     def test_registration(self):
         url = reverse('register')
         data = {
@@ -15,7 +98,14 @@ class AuthTests(APITestCase):
         }
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertTrue(CustomUser.objects.filter(email="testuser@example.com").exists())
+        # Staged until the email is verified.
+        self.assertFalse(CustomUser.objects.filter(email="testuser@example.com").exists())
+        pending = PendingRegistration.objects.get(email="testuser@example.com")
+        self.assertEqual(pending.first_name, "Test")
+
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
 
     def test_login_unverified(self):
         user = CustomUser.objects.create_user(
@@ -41,4 +131,1167 @@ class AuthTests(APITestCase):
         data = {"email": "verified@example.com", "password": "TestPass123!"}
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['email'], "verified@example.com")
\ No newline at end of file
+        self.assertEqual(response.data['email'], "verified@example.com")
+
+class EmailOutboxTests(AuthTestCase):
+    def test_registration_queues_verification_email(self):
+        url = reverse('register')
+        data = {
+            "email": "queued@example.com",
+            "password": "TestPass123!",
+            "password2": "TestPass123!",
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboundEmail.objects.get(to_email="queued@example.com")
+        self.assertEqual(email.status, OutboundEmail.Status.PENDING)
+
+        result = drain_email_outbox()
+        self.assertEqual(result['sent'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["queued@example.com"])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.SENT)
+        # The verification link is not kept once sent.
+        self.assertEqual((email.body, email.html_body), ('', ''))
+
+    @override_settings(EMAIL_OUTBOX_MAX_IN_FLIGHT=3)
+    def test_claims_stop_at_the_in_flight_limit(self):
+        for i in range(5):
+            queue_email(f"burst{i}@example.com", "Subject", "Body")
+        self.assertEqual(len(_claim_outbox_batch(2)), 2)
+        self.assertEqual(len(_claim_outbox_batch(2)), 1)
+        self.assertEqual(_claim_outbox_batch(2), [])
+
+    def test_purge_keeps_pending_and_recent_emails(self):
+        old = timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS + 1)
+        for state in OutboundEmail.Status:
+            OutboundEmail.objects.create(to_email="old@example.com", subject=state, body="", status=state, created_at=old)
+        queue_email("new@example.com", "Subject", "Body")
+        OutboundEmail.objects.filter(to_email="new@example.com").update(status=OutboundEmail.Status.SENT)
+        call_command('purge_outbound_emails', sleep=0, stdout=StringIO())
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list('to_email', 'status')),
+            [('new@example.com', 'SENT'), ('old@example.com', 'PENDING'), ('old@example.com', 'SENDING')],
+        )
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_send_is_retried_with_backoff(self):
+        email = queue_email("retry@example.com", "Subject", "Body")
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=SMTPException("down")):
+            result = drain_email_outbox()
+        self.assertEqual(result['retried'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        # Not due yet, so nothing is picked up.
+        self.assertEqual(drain_email_outbox(), {'sent': 0, 'retried': 0, 'failed': 0})
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=SMTPException("down")):
+            result = drain_email_outbox()
+        self.assertEqual(result['failed'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.FAILED)
+        self.assertEqual(email.body, '')
+
+
+class VerificationCodeTests(AuthTestCase):
+    def test_code_is_stored_hashed_and_verifies(self):
+        response = self.client.post(reverse('register'), {
+            "email": "hashed@example.com",
+            "password": "TestPass123!",
+            "password2": "TestPass123!",
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        body = OutboundEmail.objects.get(to_email="hashed@example.com").body
+        code = body.split('code=')[1].strip()
+        pending = PendingRegistration.objects.get(email="hashed@example.com")
+        self.assertEqual(pending.verification_code, hash_token(code))
+        expires_in = pending.expiry - timezone.now()
+        self.assertGreater(expires_in, timedelta(minutes=settings.VERIFICATION_CODE_EXPIRE_MINUTES - 1))
+        self.assertNotEqual(pending.verification_code, code)
+
+        response = self.client.get(reverse('verify-email'), {'code': code})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('verified=1', response.url)
+        user = CustomUser.objects.get(email="hashed@example.com")
+        self.assertTrue(user.email_verified)
+        self.assertTrue(user.is_active)
+        self.assertTrue(user.check_password("TestPass123!"))
+        self.assertFalse(PendingRegistration.objects.exists())
+
+        response = self.client.get(reverse('verify-email'), {'code': code})
+        self.assertIn('Invalid', response.url)
+
+    def test_promotion_is_atomic(self):
+        pending = PendingRegistration(
+            email="atomic@example.com", password=make_password("TestPass123!"),
+            verification_code=hash_token("atomic"), expiry=timezone.now() + timedelta(minutes=5),
+        )
+        PendingRegistration.stage([pending])
+        pending = PendingRegistration.objects.get()
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=OperationalError('locked')):
+            with self.assertRaises(OperationalError):
+                pending.promote()
+        self.assertFalse(CustomUser.objects.filter(email="atomic@example.com").exists())
+        self.assertTrue(PendingRegistration.objects.exists())
+
+    def test_legacy_unverified_user_still_verifies(self):
+        user = CustomUser.objects.create_user(
+            email="legacy@example.com", password="TestPass123!", is_active=False,
+            verification_code=hash_token("legacy"), verification_code_expiry=timezone.now() + timedelta(minutes=5),
+        )
+        response = self.client.get(reverse('verify-email'), {'code': "legacy"})
+        self.assertIn('verified=1', response.url)
+        user.refresh_from_db()
+        self.assertTrue(user.email_verified)
+
+    def test_expired_registration_is_refused_replaced_and_purged(self):
+        data = {"email": "late@example.com", "password": "TestPass123!", "password2": "TestPass123!"}
+        self.client.post(reverse('register'), data, format='json')
+        code = OutboundEmail.objects.get(to_email="late@example.com").body.split('code=')[1].strip()
+        PendingRegistration.objects.update(expiry=timezone.now() - timedelta(minutes=1))
+
+        response = self.client.get(reverse('verify-email'), {'code': code})
+        self.assertIn('expired', response.url)
+        self.assertFalse(CustomUser.objects.filter(email="late@example.com").exists())
+        # An expired registration no longer holds the email.
+        self.assertEqual(self.client.post(reverse('register'), data, format='json').status_code, 201)
+        self.assertEqual(PendingRegistration.objects.get().expiry > timezone.now(), True)
+
+        PendingRegistration.objects.create(
+            email="stale@example.com", password="!", verification_code=hash_token("stale"),
+            expiry=timezone.now() - timedelta(days=1),
+        )
+        call_command('purge_pending_registrations', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(PendingRegistration.objects.values_list('email', flat=True)), ["late@example.com"])
+
+    def test_purge_clears_only_expired_codes(self):
+        now = timezone.now()
+        expired = CustomUser.objects.create_user(
+            email="expired@example.com", password="TestPass123!",
+            verification_code=hash_token("a"), verification_code_expiry=now - timedelta(minutes=1),
+        )
+        live = CustomUser.objects.create_user(
+            email="live@example.com", password="TestPass123!",
+            verification_code=hash_token("b"), verification_code_expiry=now + timedelta(minutes=30),
+        )
+        call_command('purge_verification_codes', batch_size=1, stdout=StringIO())
+        expired.refresh_from_db()
+        live.refresh_from_db()
+        self.assertIsNone(expired.verification_code)
+        self.assertEqual(live.verification_code, hash_token("b"))
+
+
+class TokenDenylistTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(
+            email="denylist@example.com", password="TestPass123!", is_active=True, email_verified=True,
+        )
+        self.auth = DenylistJWTAuthentication()
+
+    def test_unlisted_token_needs_no_query(self):
+        token = AccessToken.for_user(self.user)
+        token_denylist.refresh(force=True)
+        with self.assertNumQueries(0):
+            validated = self.auth.get_validated_token(str(token).encode())
+        self.assertEqual(validated['jti'], token['jti'])
+
+    def test_blacklisted_token_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        BlacklistedToken.blacklist(token)
+        with self.assertRaises(InvalidToken):
+            self.auth.get_validated_token(str(token).encode())
+
+    def test_rows_from_other_processes_are_loaded_on_refresh(self):
+        token = AccessToken.for_user(self.user)
+        BlacklistedToken.objects.create(jti=token['jti'], expires_at=datetime_from_epoch(token['exp']))
+        self.assertFalse(token_denylist.might_contain(token['jti'], token['exp']))
+        token_denylist.refresh(force=True)
+        self.assertTrue(token_denylist.might_contain(token['jti'], token['exp']))
+
+    def test_repeat_tokens_are_verified_once(self):
+        raw = str(AccessToken.for_user(self.user)).encode()
+        with mock.patch.object(JWTAuthentication, 'get_validated_token',
+                               wraps=JWTAuthentication().get_validated_token) as verify:
+            first = self.auth.get_validated_token(raw)
+            self.assertIs(self.auth.get_validated_token(raw), first)
+        verify.assert_called_once()
+
+        # Revocation is still checked on a hit.
+        BlacklistedToken.blacklist(first)
+        with self.assertRaises(InvalidToken):
+            self.auth.get_validated_token(raw)
+
+    def test_verified_tokens_are_evicted_by_size_and_expiry(self):
+        tokens = [f'token-{i}'.encode() for i in range(3)]
+        with override_settings(VERIFIED_TOKEN_CACHE_SIZE=2):
+            for raw in tokens:
+                verified_tokens.put(raw, {'exp': time.time() + 60})
+        self.assertIsNone(verified_tokens.get(tokens[0]))
+        self.assertIsNotNone(verified_tokens.get(tokens[1]))
+
+        verified_tokens.put(b'expired', {'exp': time.time() - 1})
+        self.assertIsNone(verified_tokens.get(b'expired'))
+
+    def test_purge_deletes_only_expired_rows(self):
+        now = timezone.now()
+        BlacklistedToken.objects.create(jti="expired-1", expires_at=now - timedelta(days=1))
+        BlacklistedToken.objects.create(jti="expired-2", expires_at=now - timedelta(seconds=1))
+        BlacklistedToken.objects.create(jti="live", expires_at=now + timedelta(days=1))
+        RefreshTokenFamily.start(uuid.uuid4(), "expired", now - timedelta(seconds=1))
+        live = RefreshTokenFamily.start(uuid.uuid4(), "live", now + timedelta(days=1))
+        out = StringIO()
+        call_command('purge_blacklisted_tokens', batch_size=1, sleep=0, stdout=out)
+        self.assertEqual(list(BlacklistedToken.objects.values_list('jti', flat=True)), ["live"])
+        self.assertIn("Deleted 2 expired blacklisted tokens", out.getvalue())
+        self.assertEqual(list(RefreshTokenFamily.objects.values_list('pk', flat=True)), [live.pk])
+        self.assertIn("Deleted 1 expired refresh token families", out.getvalue())
+
+
+class ClaimsAuthenticationTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(
+            email="claims@example.com", password="TestPass123!",
+            is_active=True, email_verified=True, is_staff=True,
+        )
+        self.auth = ClaimsJWTAuthentication()
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.auth.authenticate(request)
+
+    def test_login_issues_tokens_with_user_claims(self):
+        response = self.client.post(reverse('login'), {
+            "email": "claims@example.com", "password": "TestPass123!",
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.data['access'])
+        self.assertEqual(access['role'], CustomUser.Role.USER)
+        self.assertTrue(access['is_staff'])
+        self.assertTrue(access['email_verified'])
+        self.assertEqual(access['ver'], 0)
+
+    def test_cached_version_authenticates_without_queries(self):
+        access = get_tokens_for_user(self.user)['access']
+        self.authenticate(access)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(access)
+        self.assertEqual(user.id, self.user.id)
+        self.assertTrue(user.is_staff)
+        self.assertEqual(user.role, CustomUser.Role.USER)
+
+    def test_revoke_tokens_rejects_access_and_refresh(self):
+        tokens = get_tokens_for_user(self.user)
+        self.authenticate(tokens['access'])
+        self.user.revoke_tokens()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(tokens['access'])
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_rotates_and_keeps_claims(self):
+        tokens = get_tokens_for_user(self.user)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], tokens['refresh'])
+        self.assertTrue(AccessToken(response.data['access'])['is_staff'])
+
+    def test_changing_copied_claims_revokes_tokens(self):
+        tokens = get_tokens_for_user(self.user)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.first_name = "Renamed"
+        user.save()
+        self.authenticate(tokens['access'])
+
+        user.is_staff = False
+        user.save(update_fields=['is_staff'])
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(tokens['access'])
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(AccessToken(get_tokens_for_user(user)['access'])['is_staff'])
+
+    def test_full_save_of_a_stale_instance_keeps_tokens_revoked(self):
+        tokens = get_tokens_for_user(self.user)
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        self.user.revoke_tokens()
+        stale.first_name = "Stale"
+        stale.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(tokens['access'])
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).first_name, "Stale")
+
+    def test_suspended_user_cannot_log_in_again(self):
+        credentials = {"email": "claims@example.com", "password": "TestPass123!"}
+        self.user.suspend()
+        response = self.client.post(reverse('login'), credentials, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('access', response.data)
+
+        CustomUser.objects.filter(pk=self.user.pk).update(status=CustomUser.Status.ACTIVE, is_active=False)
+        self.assertEqual(self.client.post(reverse('login'), credentials, format='json').status_code, 403)
+
+
+class RefreshTokenFamilyTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(
+            email="family@example.com", password="TestPass123!", is_active=True, email_verified=True,
+        )
+        self.auth = ClaimsJWTAuthentication()
+
+    def refresh(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': token}, format='json')
+
+    def test_rotation_is_one_update(self):
+        tokens = get_tokens_for_user(self.user)
+        token_versions.get(self.user.pk)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.refresh(tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q['sql'].split()[0] for q in captured], ['UPDATE'])
+        family = RefreshTokenFamily.objects.get()
+        self.assertEqual(family.jti, AuthRefreshToken(response.data['refresh'])['jti'])
+        self.assertEqual(AuthAccessToken(response.data['access'])[FAMILY_CLAIM], family.family.hex)
+
+    def test_reuse_revokes_the_whole_family(self):
+        tokens = get_tokens_for_user(self.user)
+        rotated = self.refresh(tokens['refresh']).data
+        other = get_tokens_for_user(self.user)
+
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(rotated['refresh']).status_code, 401)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {rotated['access']}")
+        token_denylist.refresh(force=True)
+        revoked_families.refresh(force=True)
+        with self.assertNumQueries(0), self.assertRaises(InvalidToken):
+            self.auth.authenticate(request)
+        # Other logins of the same user are untouched.
+        self.assertEqual(self.refresh(other['refresh']).status_code, 200)
+
+    def test_revocations_by_other_processes_are_loaded_on_refresh(self):
+        tokens = get_tokens_for_user(self.user)
+        family = AuthRefreshToken(tokens['refresh'])[FAMILY_CLAIM]
+        revoked_families.refresh(force=True)
+        RefreshTokenFamily.objects.update(revoked_at=timezone.now())
+        self.assertNotIn(family, revoked_families._families)
+        revoked_families.refresh(force=True)
+        self.assertIn(family, revoked_families)
+
+    def test_token_without_a_family_is_rejected(self):
+        refresh = AuthRefreshToken.for_user(self.user)
+        del refresh[FAMILY_CLAIM]
+        self.assertEqual(self.refresh(str(refresh)).status_code, 401)
+        self.assertFalse(RefreshTokenFamily.objects.exists())
+
+
+class IntrospectionTests(QueryBudgetTestMixin, AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gateway = CustomUser.objects.create_user(
+            email="gateway@example.com", password="TestPass123!", is_active=True, email_verified=True,
+            role=CustomUser.Role.GATEWAY,
+        )
+        self.users = [
+            CustomUser.objects.create_user(email=f"introspect-{i}@example.com", password="TestPass123!")
+            for i in range(3)
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.gateway)['access']}")
+
+    def test_batch_reports_each_token_in_order(self):
+        active, blacklisted, revoked = (get_tokens_for_user(user) for user in self.users)
+        BlacklistedToken.blacklist(AuthAccessToken(blacklisted['access']))
+        expired = AuthAccessToken(active['access'])
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+        self.users[2].revoke_tokens()
+        tokens = [active['access'], blacklisted['access'], revoked['access'], str(expired), active['refresh'], 'junk']
+
+        token_denylist.refresh(force=True)
+        revoked_families.refresh(force=True)
+        with self.assertWithinQueryBudget(TokenIntrospectView):
+            response = self.client.post(reverse('token-introspect'), {'tokens': tokens}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['active'] for result in results], [True, False, False, False, False, False])
+        self.assertEqual(results[0]['user_id'], self.users[0].pk)
+        self.assertEqual(results[0]['exp'], AuthAccessToken(active['access'])['exp'])
+        self.assertEqual(results[1]['error'], 'Token is blacklisted')
+        self.assertEqual(results[2]['error'], 'Token has been revoked')
+        self.assertIn('expired', results[3]['error'])
+
+    def test_revocation_checks_do_not_grow_with_the_batch(self):
+        tokens = [get_tokens_for_user(user)['access'] for user in self.users for _ in range(5)]
+        token_denylist.refresh(force=True)
+        revoked_families.refresh(force=True)
+        with self.assertNumQueries(1):  # token versions of the three users
+            results = introspect(tokens)
+        self.assertTrue(all(result['active'] for result in results))
+        with self.assertNumQueries(0):
+            introspect(tokens)
+
+    def test_requires_a_gateway_and_bounds_the_batch(self):
+        with override_settings(TOKEN_INTROSPECTION_MAX_BATCH=2):
+            response = self.client.post(reverse('token-introspect'), {'tokens': ['a', 'b', 'c']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.users[0])['access']}")
+        response = self.client.post(reverse('token-introspect'), {'tokens': ['a']}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.users[1].is_staff = True
+        self.users[1].save()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.users[1])['access']}")
+        response = self.client.post(reverse('token-introspect'), {'tokens': ['a']}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class PasswordHashingTests(AuthTestCase):
+    def test_login_rehashes_outdated_work_factor(self):
+        user = CustomUser.objects.create_user(
+            email="rehash@example.com", password="TestPass123!", is_active=True, email_verified=True,
+        )
+        user.password = PBKDF2PasswordHasher().encode("TestPass123!", "saltsalt", iterations=1000)
+        user.save(update_fields=['password'])
+
+        response = self.client.post(reverse('login'), {
+            "email": "rehash@example.com", "password": "TestPass123!",
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertFalse(needs_rehash(user.password))
+        self.assertTrue(user.check_password("TestPass123!"))
+
+    @override_settings(PASSWORD_HASHER_ITERATIONS=1000)
+    def test_calibrated_iterations_are_used(self):
+        self.assertTrue(hash_password("TestPass123!").startswith("pbkdf2_sha256$1000$"))
+
+    def test_full_queue_is_rejected(self):
+        release = threading.Event()
+        slots = settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE_DEPTH
+        futures = [hashers.submit(release.wait) for _ in range(slots)]
+        try:
+            with self.assertRaises(hashers.HashingBusy):
+                hashers.submit(release.wait)
+        finally:
+            release.set()
+            for future in futures:
+                future.result()
+
+    def test_calibration_command_reports_iterations(self):
+        out = StringIO()
+        call_command('calibrate_password_hasher', target_ms=1, samples=1, min_iterations=0, stdout=out)
+        self.assertIn("PASSWORD_HASHER_ITERATIONS=", out.getvalue())
+
+        # Never below Django's default, which would rehash passwords down on login.
+        out = StringIO()
+        call_command('calibrate_password_hasher', target_ms=1, samples=1, stdout=out, stderr=StringIO())
+        self.assertIn(f"PASSWORD_HASHER_ITERATIONS={PBKDF2PasswordHasher.iterations} ", out.getvalue())
+
+
+class AsyncViewTests(AuthTestCase):
+    factory = AsyncRequestFactory()
+
+    def post(self, view, data):
+        request = self.factory.post('/', data, content_type='application/json')
+        return view.as_view()(request)
+
+    async def test_register_verify_and_login(self):
+        response = await self.post(AsyncRegisterView, {
+            "email": "async@example.com",
+            "password": "TestPass123!",
+            "password2": "TestPass123!",
+        })
+        self.assertEqual(response.status_code, 201)
+        email = await OutboundEmail.objects.aget(to_email="async@example.com")
+        code = email.body.split('code=')[1].strip()
+
+        response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "TestPass123!"})
+        self.assertEqual(response.status_code, 403)
+
+        response = await AsyncVerifyEmailView.as_view()(self.factory.get('/', {'code': code}))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('verified=1', response.url)
+
+        response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "TestPass123!"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', json.loads(response.content))
+
+        user = await CustomUser.objects.aget(email="async@example.com")
+        user.status = CustomUser.Status.SUSPENDED
+        await user.arevoke_tokens(update_fields=['status'])
+        response = await self.post(AsyncLoginView, {"email": "async@example.com", "password": "TestPass123!"})
+        self.assertEqual(response.status_code, 403)
+
+    async def test_throttles_are_checked_off_the_event_loop(self):
+        threads = []
+        check_throttles = AsyncAPIView.check_throttles
+
+        def check(view, request):
+            threads.append(threading.get_ident())
+            return check_throttles(view, request)
+
+        with mock.patch.object(AsyncAPIView, 'check_throttles', check):
+            response = await self.post(AsyncLoginView, {"email": "nobody@example.com", "password": "TestPass123!"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    async def test_duplicate_and_invalid_registration(self):
+        await self.post(AsyncRegisterView, {
+            "email": "dup@example.com", "password": "TestPass123!", "password2": "TestPass123!",
+        })
+        response = await self.post(AsyncRegisterView, {
+            "email": "dup@example.com", "password": "TestPass123!", "password2": "TestPass123!",
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', json.loads(response.content))
+
+        response = await self.post(AsyncRegisterView, {
+            "email": "other@example.com", "password": "TestPass123!", "password2": "Mismatch123!",
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', json.loads(response.content))
+
+    async def test_password_reset_flow(self):
+        await CustomUser.objects.acreate(email="reset@example.com", password=make_password("OldPass123!"))
+        response = await self.post(AsyncPasswordResetView, {"email": "reset@example.com"})
+        self.assertEqual(response.status_code, 200)
+        user = await CustomUser.objects.aget(email="reset@example.com")
+
+        response = await self.post(AsyncPasswordResetConfirmView, {
+            "token": user.reset_token, "new_password": "NewPass456!",
+        })
+        self.assertEqual(response.status_code, 200)
+        await user.arefresh_from_db()
+        self.assertTrue(user.check_password("NewPass456!"))
+        self.assertEqual(user.token_version, 1)
+
+
+class UserListTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create_user(
+            email="admin@example.com", password="TestPass123!", is_active=True, email_verified=True, is_staff=True,
+        )
+        # Bypass hashing; these rows are only listed.
+        CustomUser.objects.bulk_create([
+            CustomUser(email=f"user{i}@example.com", password="!") for i in range(5)
+        ])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.admin)['access']}")
+
+    def test_cursor_pages_cover_all_users_once(self):
+        url = reverse('user-list') + '?page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(CustomUser.objects.values_list('id', flat=True)))
+        self.assertNotIn('password', response.data['results'][0])
+
+    def test_page_query_only_selects_serialized_columns(self):
+        self.client.get(reverse('user-list'))  # warm the token version cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user-list') + '?page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertNotIn('password', sql)
+        self.assertIn('LIMIT 3', sql)
+
+    @override_settings(USER_LIST_PAGE_SIZE=2, USER_LIST_MAX_PAGE_SIZE=3)
+    def test_page_size_settings_are_read_per_request(self):
+        self.assertEqual(len(self.client.get(reverse('user-list')).data['results']), 2)
+        self.assertEqual(len(self.client.get(reverse('user-list') + '?page_size=5').data['results']), 3)
+
+    def test_non_staff_is_forbidden(self):
+        user = CustomUser.objects.get(email="user0@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(user)['access']}")
+        self.assertEqual(self.client.get(reverse('user-list')).status_code, 403)
+
+    def test_export_streams_ndjson_and_gzipped_csv(self):
+        response = self.client.get(reverse('user-export'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['email'], "admin@example.com")
+        self.assertNotIn('password', rows[0])
+
+        response = self.client.get(reverse('user-export'), {'fmt': 'csv', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(UserSerializer.Meta.fields))
+        self.assertEqual(len(lines), 7)
+
+    def test_export_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.ndjson.gz')
+            call_command('export_users', output=path, gzip=True)
+            with gzip.open(path) as f:
+                self.assertEqual(len(f.read().splitlines()), 6)
+
+
+class ResponseCacheTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create_user(
+            email="admin@example.com", password="TestPass123!", is_active=True, email_verified=True, is_staff=True,
+        )
+        self.user = CustomUser.objects.create_user(email="cached@example.com", password="TestPass123!")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.admin)['access']}")
+        self.url = reverse('user-detail', kwargs={'id': self.user.pk})
+
+    def test_revalidation_is_answered_from_the_cache(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['email'], "cached@example.com")
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_entries_are_rebuilt_from_the_primary_after_a_write(self):
+        routers._health.clear()
+        self.user.first_name = "Changed"
+        self.user.save()
+        # There is no replica1 connection in tests, so a replica read would raise.
+        self.assertEqual(self.client.get(self.url).data['first_name'], "Changed")
+
+    def test_saving_shown_fields_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.user.set_password("OtherPass123!")
+        self.user.save(update_fields=['password'])
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+        self.user.first_name = "Changed"
+        self.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], "Changed")
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_users_and_suspension_invalidate_the_list(self):
+        list_url = reverse('user-list')
+        self.assertEqual(len(self.client.get(list_url).data['results']), 2)
+        CustomUser.objects.create_user(email="another@example.com", password="TestPass123!")
+        self.assertEqual(len(self.client.get(list_url).data['results']), 3)
+
+        self.client.get(self.url)
+        self.user.suspend()
+        self.assertEqual(self.client.get(self.url).data['status'], CustomUser.Status.SUSPENDED)
+
+
+class ThrottleTests(AuthTestCase):
+    def test_login_scope_rejects_burst_before_hashing(self):
+        data = {"email": "nobody@example.com", "password": "TestPass123!"}
+        for _ in range(5):
+            self.assertEqual(self.client.post(reverse('login'), data, format='json').status_code, 400)
+        with mock.patch('Authentication.views.check_user_password') as check:
+            response = self.client.post(reverse('login'), data, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        check.assert_not_called()
+
+    def test_counters_are_shared_through_the_store(self):
+        # A second store on the same file stands in for another worker process.
+        other_worker = SlidingWindowStore(settings.THROTTLE_STORE_PATH)
+        for _ in range(5):
+            other_worker.hit('throttle_login_127.0.0.1', 60)
+        response = self.client.post(reverse('login'), {"email": "a@example.com", "password": "x"}, format='json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        store = get_store()
+        for _ in range(10):
+            store.hit('k', 60, now=59.0)
+        _, current, previous, elapsed = store.hit('k', 60, now=90.0)
+        self.assertEqual((current, previous, elapsed), (1, 10, 30.0))
+        _, current, previous, _ = store.hit('k', 60, now=200.0)
+        self.assertEqual((current, previous), (1, 0))
+
+    def test_rejected_requests_are_not_counted(self):
+        store = get_store()
+        self.assertEqual([store.hit('k', 60, 2, now=1.0)[0] for _ in range(4)], [True, True, False, False])
+        # Retrying while blocked does not carry over into the next window.
+        self.assertEqual(store.hit('k', 60, 2, now=119.0)[:3], (True, 1, 2))
+
+    def test_expired_rows_are_purged(self):
+        store = get_store()
+        store.hit('old', 60, now=0.0)
+        store._next_purge = 0.0
+        store.hit('new', 60, now=120.0)
+        keys = [key for key, in store._connection().execute('SELECT key FROM throttle')]
+        self.assertEqual(keys, ['new'])
+
+    def test_locked_store_lets_requests_through(self):
+        with mock.patch.object(SlidingWindowStore, 'hit', side_effect=sqlite3.OperationalError('database is locked')):
+            with self.assertLogs('Auth.throttling', 'WARNING'):
+                response = self.client.post(reverse('login'), {"email": "a@example.com", "password": "x"}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BenchmarkTests(AuthTestCase):
+    def test_percentile_uses_nearest_rank(self):
+        values = [0.001 * i for i in range(1, 101)]
+        self.assertEqual(benchmarks.percentile(values, 50), values[49])
+        self.assertEqual(benchmarks.percentile(values, 99), values[98])
+        self.assertEqual(benchmarks.percentile([], 95), 0.0)
+
+    def test_compare_flags_regressions_past_threshold(self):
+        baseline = {'scenarios': {'login': {'p95_ms': 100.0, 'rps': 50.0, 'queries_per_request': 2.0}}}
+        report = {'scenarios': {'login': {'p95_ms': 125.0, 'rps': 48.0, 'queries_per_request': 2.0}}}
+        rows = {row[1]: row for row in benchmarks.compare(report, baseline, threshold=10)}
+        self.assertTrue(rows['p95_ms'][5])
+        self.assertFalse(rows['rps'][5])
+        self.assertFalse(rows['queries_per_request'][5])
+
+
+class MetricsTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.histograms.reset()
+        CustomUser.objects.create_user(email="timed@example.com", password="TestPass123!", email_verified=True)
+
+    def login(self):
+        return self.client.post(
+            reverse('login'), {"email": "timed@example.com", "password": "TestPass123!"}, format='json'
+        )
+
+    def test_disabled_by_default(self):
+        response = self.login()
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_server_timing_and_histograms_across_workers(self):
+        with tempfile.TemporaryDirectory() as tmp, self.settings(METRICS_ENABLED=True, METRICS_DIR=tmp):
+            response = self.login()
+            phases = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+            self.assertEqual(phases, ['user_lookup', 'password', 'jwt', 'total'])
+
+            # Another worker's flushed counts are summed into the scrape.
+            with open(os.path.join(tmp, '99999-other.json'), 'w') as f:
+                json.dump([[metrics.REQUEST_METRIC, [['endpoint', 'login'], ['method', 'POST'], ['status', '2xx']],
+                            [1] + [0] * len(metrics.BUCKETS) + [0.0005]]], f)
+            body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('auth_request_duration_seconds_count{endpoint="login",method="POST",status="2xx"} 2', body)
+        self.assertIn('auth_phase_duration_seconds_count{endpoint="login",phase="password"} 1', body)
+
+    def test_verified_token_cache_lookups_are_counted(self):
+        user = CustomUser.objects.create_user(
+            email="counted@example.com", password="TestPass123!", email_verified=True, is_staff=True,
+        )
+        url = reverse('user-detail', kwargs={'id': user.pk})
+        with tempfile.TemporaryDirectory() as tmp, self.settings(METRICS_ENABLED=True, METRICS_DIR=tmp):
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(user)['access']}")
+            for _ in range(3):
+                self.assertEqual(self.client.get(url).status_code, 200)
+            body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE auth_verified_token_cache_lookups_total counter', body)
+        self.assertIn('auth_verified_token_cache_lookups_total{result="hit"} 2', body)
+        self.assertIn('auth_verified_token_cache_lookups_total{result="miss"} 1', body)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, AuthTestCase):
+    def test_auth_flow_stays_within_budgets(self):
+        with self.assertWithinQueryBudget(RegisterView) as captured:
+            response = self.client.post(reverse('register'), {
+                "email": "budget@example.com", "password": "TestPass123!", "password2": "TestPass123!",
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sum(q['sql'].startswith('INSERT INTO "Authentication_pendingregistration"') for q in captured), 1)
+        self.assertFalse(any(q['sql'].startswith('UPDATE') for q in captured))
+
+        code = OutboundEmail.objects.get(to_email="budget@example.com").body.split('code=')[1].strip()
+        with self.assertWithinQueryBudget(VerifyEmailView):
+            self.assertEqual(self.client.get(reverse('verify-email'), {'code': code}).status_code, 302)
+
+        credentials = {"email": "budget@example.com", "password": "TestPass123!"}
+        with self.assertWithinQueryBudget(LoginView):
+            response = self.client.post(reverse('login'), credentials, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertWithinQueryBudget(TokenRefreshView):
+            response = self.client.post(reverse('token_refresh'), {'refresh': response.data['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertWithinQueryBudget(PasswordResetView):
+            self.client.post(reverse('password-reset'), {"email": "budget@example.com"}, format='json')
+        token = CustomUser.objects.get(email="budget@example.com").reset_token
+        with self.assertWithinQueryBudget(PasswordResetConfirmView):
+            response = self.client.post(reverse('password-reset-confirm'), {
+                'token': token, 'new_password': 'NewPass123!',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        user = CustomUser.objects.get(email="budget@example.com")
+        self.assertEqual(user.token_version, 1)
+        self.assertTrue(user.check_password('NewPass123!'))
+
+    def test_user_list_within_budget(self):
+        admin = CustomUser.objects.create_superuser(email="admin@example.com", password="TestPass123!")
+        self.client.force_authenticate(admin)
+        with self.assertWithinQueryBudget(UserListAPIView):
+            self.assertEqual(self.client.get(reverse('user-list')).status_code, 200)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_middleware_raises_over_budget(self):
+        with mock.patch.object(VerifyEmailView, 'query_budget', 0):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'over the budget of 0'):
+                self.client.get(reverse('verify-email'), {'code': 'nope'})
+
+
+@override_settings(BULK_IMPORT_WORKERS=2, BULK_IMPORT_BATCH_SIZE=2)
+class BulkImportTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create_superuser(email="admin@example.com", password="TestPass123!")
+        self.client.force_authenticate(self.admin)
+        self.legacy_hash = PBKDF2PasswordHasher().encode('Legacy123!', 'somesalt', iterations=1000)
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        self.enterContext(override_settings(BULK_IMPORT_DIR=upload_dir.name))
+
+    def test_ndjson_import_reports_row_errors(self):
+        rows = [
+            json.dumps({"email": "new@example.com", "password": "TestPass123!", "first_name": "New"}),
+            json.dumps({"email": "legacy@example.com", "password_hash": self.legacy_hash}),
+            json.dumps({"email": "admin@example.com", "password_hash": self.legacy_hash}),
+            json.dumps({"email": "not-an-email", "password_hash": self.legacy_hash}),
+            '{"email": ',
+            json.dumps({"email": "legacy@example.com", "password_hash": self.legacy_hash}),
+            json.dumps({"email": "bad-hash@example.com", "password_hash": "plaintext"}),
+        ]
+        response = self.client.generic(
+            'POST', reverse('user-import'), '\n'.join(rows).encode(), content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.status_code, 202)
+        # The request only stages the upload.
+        self.assertFalse(PendingRegistration.objects.exists())
+        self.assertEqual(self.client.get(response.data['url']).data, {'status': 'queued'})
+
+        call_command('import_users', staged=True, stdout=StringIO())
+        response = self.client.get(response.data['url'])
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 5))
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4, 5, 6, 7])
+
+        # Unverified imports are staged like registrations.
+        self.assertFalse(CustomUser.objects.filter(email="new@example.com").exists())
+        pending = PendingRegistration.objects.get(email="new@example.com")
+        self.assertEqual(pending.first_name, "New")
+        self.assertTrue(check_password("TestPass123!", pending.password))
+        self.assertEqual(PendingRegistration.objects.get(email="legacy@example.com").password, self.legacy_hash)
+        self.assertEqual(OutboundEmail.objects.filter(subject='Verify your email').count(), 2)
+
+        # Imported uploads are not picked up again.
+        call_command('import_users', staged=True, stdout=StringIO())
+        self.assertEqual(PendingRegistration.objects.count(), 2)
+
+    def test_undecodable_and_malformed_rows_are_row_errors(self):
+        data = b'email,first_name\na@example.com,Jos\xe9\nb@example.com,"' + b'x' * 200000 + b'"\nc@example.com,Bob\n'
+        rows = list(bulk_import.iter_rows(BytesIO(data), 'csv'))
+        self.assertEqual(rows[:2], ['Invalid UTF-8.', 'Invalid CSV: field larger than field limit (131072).'])
+        self.assertEqual(rows[2]['email'], 'c@example.com')
+        rows = list(bulk_import.iter_rows(BytesIO(b'{"email": "\xe9"}\n{"email": "d@example.com"}\n'), 'ndjson'))
+        self.assertEqual(rows, ['Invalid UTF-8.', {'email': 'd@example.com'}])
+
+    def test_failed_import_is_reported_and_old_results_removed(self):
+        response = self.client.generic('POST', reverse('user-import'), b'email\n', content_type='text/csv')
+        with mock.patch.object(bulk_import, 'import_users', side_effect=OperationalError('disk I/O error')):
+            with self.assertLogs('Authentication.bulk_import', 'ERROR'):
+                call_command('import_users', staged=True, stdout=StringIO())
+        result = self.client.get(response.data['url']).data
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('error', result)
+
+        old = time.time() - (settings.BULK_IMPORT_RESULT_DAYS + 1) * 86400
+        os.utime(os.path.join(settings.BULK_IMPORT_DIR, f"{response.data['id']}.json"), (old, old))
+        call_command('import_users', staged=True, stdout=StringIO())
+        self.assertEqual(self.client.get(response.data['url']).status_code, 404)
+
+    @override_settings(BULK_IMPORT_MAX_BYTES=10)
+    def test_upload_size_is_limited(self):
+        response = self.client.generic('POST', reverse('user-import'), b'email\n' * 10, content_type='text/csv')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(os.listdir(settings.BULK_IMPORT_DIR), [])
+
+    def test_unknown_import_is_not_found(self):
+        response = self.client.get(reverse('user-import-status', kwargs={'upload_id': uuid.uuid4()}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_import_requires_admin(self):
+        self.client.force_authenticate(None)
+        response = self.client.generic('POST', reverse('user-import'), b'', content_type='text/csv')
+        self.assertEqual(response.status_code, 401)
+
+    def test_command_imports_verified_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.csv')
+            with open(path, 'w') as f:
+                f.write('email,password_hash,phone\n')
+                f.write(f'one@example.com,{self.legacy_hash},\n')
+                f.write(f'two@example.com,{self.legacy_hash},555\n')
+                f.write('three@example.com,,\n')
+            errors = os.path.join(tmp, 'errors.ndjson')
+            call_command('import_users', path, verified=True, errors=errors, stdout=StringIO())
+            with open(errors) as f:
+                self.assertEqual([json.loads(line)['row'] for line in f], [3])
+
+        self.assertTrue(CustomUser.objects.get(email="two@example.com", phone="555").email_verified)
+        self.assertTrue(CustomUser.objects.get(email="one@example.com").is_active)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_HEALTH_CHECK_SECONDS=60)
+class ReplicaRouterTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        routers._health.clear()
+        self.router = routers.ReplicaRouter()
+
+    @mock.patch.object(routers, 'replica_is_healthy', return_value=True)
+    def test_reads_use_replica_only_when_allowed_and_until_a_write(self, healthy):
+        self.assertEqual(self.router.db_for_read(CustomUser), 'default')
+        with routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(CustomUser), 'replica1')
+            self.assertEqual(self.router.db_for_write(CustomUser), 'default')
+            self.assertEqual(self.router.db_for_read(CustomUser), 'default')
+        self.assertEqual(self.router.db_for_read(CustomUser), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'Authentication'))
+
+    @mock.patch.object(routers, 'replica_is_healthy', return_value=True)
+    def test_middleware_allows_replica_reads_for_read_replica_views(self, healthy):
+        def view_chain(request):
+            # What Django's handler does inside the middleware: process_view, then the view.
+            middleware.process_view(request, request.view.as_view(), (), {})
+            return self.router.db_for_read(CustomUser)
+
+        middleware = routers.ReplicaRoutingMiddleware(view_chain)
+        request = APIRequestFactory().get('/')
+        request.view = UserListAPIView
+        self.assertEqual(middleware(request), 'replica1')
+        request.view = LoginView
+        self.assertEqual(middleware(request), 'default')
+        self.assertEqual(self.router.db_for_read(CustomUser), 'default')
+
+    @mock.patch.object(routers, 'replica_is_healthy', return_value=True)
+    def test_revocation_data_is_read_from_the_primary(self, healthy):
+        user = CustomUser.objects.create_user(email="revoked@example.com", password="TestPass123!")
+        token = AccessToken.for_user(user)
+        BlacklistedToken.blacklist(token)
+        # There is no replica1 connection in tests: reading it would raise.
+        with override_settings(DATABASE_REPLICAS=['replica1']), routers.replica_reads():
+            self.assertEqual(routers.get_read_alias(), 'replica1')
+            token_versions.get(user.pk)
+            token_versions.get_many({user.pk + 1})
+            token_denylist.refresh(force=True)
+            self.assertTrue(token_denylist.is_blacklisted(token['jti'], token['exp']))
+            self.assertEqual(token_denylist.blacklisted([(token['jti'], token['exp'])]), {token['jti']})
+            revoked_families.refresh(force=True)
+
+    async def test_middleware_runs_async_without_a_thread_hop(self):
+        async def view_chain(request):
+            return routers._pinned.get()
+
+        middleware = routers.ReplicaRoutingMiddleware(view_chain)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertIsNone(await middleware(AsyncRequestFactory().get('/')))
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        broken = mock.Mock()
+        broken.ensure_connection.side_effect = OperationalError('down')
+        with mock.patch.object(routers, 'connections', {'replica1': broken}), routers.replica_reads():
+            self.assertEqual(routers.get_read_alias(), 'default')
+            self.assertEqual(routers.get_read_alias(), 'default')
+        broken.ensure_connection.assert_called_once()
+
+
+class SchemaTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        schema.reset()
+        self.addCleanup(schema.reset)
+
+    def test_schema_is_generated_once_and_revalidated_by_etag(self):
+        with mock.patch.object(schema, 'generate_schema', wraps=schema.generate_schema) as generate:
+            response = self.client.get(reverse('schema-json'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['paths']['/users/']['get']['summary'], "List all users (Admin only)")
+            etag = response['ETag']
+            self.assertFalse(etag.startswith('W/'))
+            response = self.client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(self.client.get(reverse('schema-json'))['ETag'], etag)
+        generate.assert_called_once()
+
+        response = self.client.get(reverse('schema-swagger-ui'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('schema-json'))
+
+    def test_prebuilt_schema_file_is_served_as_is(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'openapi.json')
+            call_command('generate_openapi_schema', output=path, stdout=StringIO())
+            with open(path, 'rb') as f:
+                generated = f.read()
+            with override_settings(OPENAPI_SCHEMA_FILE=path), \
+                    mock.patch.object(schema, 'generate_schema') as generate:
+                response = self.client.get(reverse('schema-json'))
+        self.assertEqual(response.content, generated)
+        generate.assert_not_called()
+
+
+class KeyRingTests(AuthTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.old_key = self.write_key(tmp.name, 'old.pem', rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        self.new_key = self.write_key(tmp.name, 'new.pem', ed25519.Ed25519PrivateKey.generate())
+        self.user = CustomUser.objects.create_user(
+            email="keyring@example.com", password="TestPass123!", is_active=True, email_verified=True, is_staff=True,
+        )
+
+    def write_key(self, directory, name, key):
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as f:
+            f.write(key.private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+            ))
+        return path
+
+    def test_tokens_are_signed_by_the_first_key_and_verify_against_the_jwks(self):
+        with override_settings(JWT_KEY_FILES=[self.new_key, self.old_key]):
+            response = self.client.post(reverse('login'), {
+                "email": "keyring@example.com", "password": "TestPass123!",
+            }, format='json')
+            access = response.data['access']
+            jwks = self.client.get(reverse('jwks')).json()
+        header = jwt.get_unverified_header(access)
+        self.assertEqual(header['alg'], 'EdDSA')
+        self.assertEqual([key['kid'] for key in jwks['keys']][0], header['kid'])
+        self.assertEqual(len(jwks['keys']), 2)
+        self.assertNotIn('d', jwks['keys'][0])
+        payload = jwt.decode(access, jwt.PyJWK(jwks['keys'][0]).key, algorithms=['EdDSA'])
+        self.assertEqual(payload['user_id'], self.user.pk)
+
+    def test_tokens_of_a_retired_signer_stay_valid(self):
+        with override_settings(JWT_KEY_FILES=[self.old_key]):
+            access = get_tokens_for_user(self.user)['access']
+            self.assertEqual(jwt.get_unverified_header(access)['alg'], 'RS256')
+        with override_settings(JWT_KEY_FILES=[self.new_key, self.old_key]):
+            response = self.client.get(reverse('user-detail', kwargs={'id': self.user.pk}),
+                                       HTTP_AUTHORIZATION=f'Bearer {access}')
+            self.assertEqual(response.status_code, 200)
+        with override_settings(JWT_KEY_FILES=[self.new_key]):
+            response = self.client.get(reverse('user-detail', kwargs={'id': self.user.pk}),
+                                       HTTP_AUTHORIZATION=f'Bearer {access}')
+            self.assertEqual(response.status_code, 401)
+
+    def test_jwks_is_cacheable(self):
+        with override_settings(JWT_KEY_FILES=[self.new_key]):
+            response = self.client.get(reverse('jwks'))
+            self.assertEqual(response['Cache-Control'], f'public, max-age={settings.JWKS_MAX_AGE}')
+            response = self.client.get(reverse('jwks'), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse('jwks')).json(), {'keys': []})
+
+
+class StartupReportTests(AuthTestCase):
+    def test_api_profile_skips_session_static_and_filter_machinery(self):
+        report = startup.profile('Auth.settings_api')
+        modules = {name for name, _, _ in report['modules']}
+        self.assertIn('Authentication.views', modules)
+        self.assertNotIn('django.contrib.sessions.backends.base', modules)
+        self.assertNotIn('django.contrib.staticfiles.finders', modules)
+        self.assertNotIn('django_filters.rest_framework', modules)
+        self.assertNotIn('drf_yasg.utils', modules)
+        self.assertGreater(report['rss_kb'], 0)
+        self.assertEqual(startup.by_package([('a.b', 2, 5), ('a', 3, 3), ('c', 1, 1)]), [('a', 5), ('c', 1)])
+
+
+class StatelessPathMiddlewareTests(AuthTestCase):
+    def test_api_skips_the_stateful_chain(self):
+        response = self.client.post(reverse('login'), {"email": "nobody@example.com", "password": "x"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('X-Frame-Options', response)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+
+    def test_admin_keeps_sessions_and_csrf(self):
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+
+        self.client.handler.enforce_csrf_checks = True
+        response = self.client.post('/admin/login/', {'username': 'a@example.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 403)
+
+
+class LoggingTests(AuthTestCase):
+    def make_record(self, level, msg, *args, **extra):
+        record = logging.LogRecord('test', level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_queue_handler_writes_json_lines_off_the_calling_thread(self):
+        out = StringIO()
+        target = logging.StreamHandler(out)
+        target.setFormatter(JSONFormatter())
+        handler = BoundedQueueHandler([target])
+        try:
+            handler.handle(self.make_record(logging.WARNING, 'Bad Request: %s', '/x', status_code=400, request=object()))
+        finally:
+            handler.close()
+        entry = json.loads(out.getvalue())
+        self.assertEqual(entry['message'], 'Bad Request: /x')
+        self.assertEqual(entry['status_code'], 400)
+        self.assertEqual(entry['level'], 'WARNING')
+
+    def test_full_queue_drops_and_reports_instead_of_blocking(self):
+        release = threading.Event()
+        out = StringIO()
+
+        class SlowHandler(logging.StreamHandler):
+            def handle(self, record):
+                release.wait(5)
+                return super().handle(record)
+
+        target = SlowHandler(out)
+        handler = BoundedQueueHandler([target], maxsize=2)
+        try:
+            for i in range(5):
+                handler.handle(self.make_record(logging.INFO, 'record %d', i))
+            self.assertGreater(handler.dropped, 0)
+            release.set()
+            handler.queue.join()
+            handler.handle(self.make_record(logging.INFO, 'after'))
+        finally:
+            release.set()
+            handler.close()
+        lines = out.getvalue().splitlines()
+        # The listener may make room mid-burst, splitting the report in several.
+        reports = [line for line in lines if line.startswith('Log queue full: dropped ')]
+        self.assertEqual(sum(int(line.split()[4]) for line in reports), handler.dropped)
+        self.assertEqual(len(lines) - len(reports), 5 - handler.dropped + 1)
+        self.assertEqual(lines[-1], 'after')
+
+    def test_sampling_keeps_errors(self):
+        sampler = SamplingFilter(rate=0, level='ERROR')
+        self.assertFalse(sampler.filter(self.make_record(logging.WARNING, 'Not Found')))
+        self.assertTrue(sampler.filter(self.make_record(logging.ERROR, 'Internal Server Error')))
+        self.assertTrue(SamplingFilter(rate=1).filter(self.make_record(logging.WARNING, 'Not Found')))
@@ -0,0 +1,96 @@
+import uuid
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from Auth.metrics import timer
+
+from .keyring import get_token_backend
+from .models import RefreshTokenFamily
+
+TOKEN_VERSION_CLAIM = 'ver'
+FAMILY_CLAIM = 'fam'
+
+
+class KeyRingTokenMixin:
+    """Signs and verifies with JWT_KEY_FILES when set (see keyring.py)."""
+
+    @property
+    def token_backend(self):
+        return get_token_backend()
+
+
+class AuthAccessToken(KeyRingTokenMixin, AccessToken):
+    pass
+
+
+class AuthRefreshToken(KeyRingTokenMixin, RefreshToken):
+    """
+    Refresh token carrying the claims ClaimsJWTAuthentication builds the request
+    user from, and the RefreshTokenFamily it belongs to. Access tokens minted
+    from it copy these claims.
+    """
+    access_token_class = AuthAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role'] = user.role
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['email_verified'] = user.email_verified
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        token[FAMILY_CLAIM] = uuid.uuid4().hex
+        return token
+
+    def family_fields(self):
+        return {
+            'family': self[FAMILY_CLAIM],
+            'jti': self[api_settings.JTI_CLAIM],
+            'expires_at': datetime_from_epoch(self['exp']),
+        }
+
+    def rotate(self):
+        """
+        Give the token a new jti and lifetime, recording it as the only usable
+        token of its family. Raises TokenError, after revoking the family, if the
+        token had already been rotated: someone is replaying it, or if it has
+        no family.
+        """
+        family, jti = self.get(FAMILY_CLAIM), self[api_settings.JTI_CLAIM]
+        if family is None:
+            # Every refresh token is issued with a family; one without could be
+            # replayed without ever being detected.
+            raise TokenError(_('Token has no family'))
+        self.set_jti()
+        self.set_exp()
+        self.set_iat()
+        fields = self.family_fields()
+        if not RefreshTokenFamily.rotate(family, jti, fields['jti'], fields['expires_at']):
+            RefreshTokenFamily.revoke(family)
+            raise TokenError(_('Token has already been used'))
+
+
+def get_tokens_for_user(user):
+    with timer('jwt'):
+        refresh = AuthRefreshToken.for_user(user)
+        tokens = {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    RefreshTokenFamily.start(**refresh.family_fields())
+    return tokens
+
+
+async def aget_tokens_for_user(user):
+    with timer('jwt'):
+        refresh = AuthRefreshToken.for_user(user)
+        tokens = {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    await RefreshTokenFamily.astart(**refresh.family_fields())
+    return tokens
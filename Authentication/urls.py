@@ -1,18 +1,40 @@
+from django.conf import settings
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     RegisterView, 
     PasswordResetView, 
     PasswordResetConfirmView, 
     VerifyEmailView, 
     LoginView, 
+    TokenRefreshView,
+    TokenIntrospectView,
+    UserListAPIView,
+    UserDetailAPIView,
+    UserExportView,
+    UserImportView,
+    UserImportStatusView,
 ) 
 
+if settings.ASYNC_AUTH_VIEWS:
+    from .async_views import (
+        AsyncRegisterView as RegisterView,
+        AsyncPasswordResetView as PasswordResetView,
+        AsyncPasswordResetConfirmView as PasswordResetConfirmView,
+        AsyncVerifyEmailView as VerifyEmailView,
+        AsyncLoginView as LoginView,
+    )
+
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('verify-email/', VerifyEmailView.as_view(), name='verify-email'),
     path('login/', LoginView.as_view(), name='login'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/introspect/', TokenIntrospectView.as_view(), name='token-introspect'),
     path('password-reset/', PasswordResetView.as_view(), name='password-reset'),
     path('password-reset-confirm/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
+    path('users/', UserListAPIView.as_view(), name='user-list'),
+    path('users/<int:id>/', UserDetailAPIView.as_view(), name='user-detail'),
+    path('users/export/', UserExportView.as_view(), name='user-export'),
+    path('users/import/', UserImportView.as_view(), name='user-import'),
+    path('users/import/<uuid:upload_id>/', UserImportStatusView.as_view(), name='user-import-status'),
 ]
\ No newline at end of file
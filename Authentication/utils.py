@@ -1,28 +1,191 @@
-from django.core.mail import send_mail
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
+from django.db.models import Count, F, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, Least, RowNumber
+from django.utils import timezone
 
-def send_verification_email(user, verification_code):
+from Auth import metrics
+from .models import OutboundEmail
+
+
+def hash_token(value):
+    """
+    Fixed-width digest used to store one-time codes, so lookups are a single
+    probe on a unique index and a database leak does not expose live codes.
+    """
+    return hashlib.sha256(value.encode()).hexdigest()
+
+def iter_pk_batches(queryset, batch_size):
+    """
+    Yield lists of primary keys from `queryset`, at most `batch_size` at a time.
+    The caller must make the yielded rows stop matching the queryset (update or
+    delete them), otherwise the same batch comes back forever.
+    """
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+
+def queue_email(to_email, subject, message, html_message=''):
+    """
+    Store an email in the outbox. It is delivered later by `drain_email_outbox`
+    so the request never waits on SMTP.
+    """
+    with metrics.timer('email_queue'):
+        return OutboundEmail.objects.create(
+            to_email=to_email,
+            subject=subject,
+            body=message,
+            html_body=html_message,
+        )
+
+async def aqueue_email(to_email, subject, message, html_message=''):
+    with metrics.timer('email_queue'):
+        return await OutboundEmail.objects.acreate(
+            to_email=to_email,
+            subject=subject,
+            body=message,
+            html_body=html_message,
+        )
+
+def _verification_email(user, verification_code):
     verification_url = f"{settings.BACKEND_URL}/api/v1/verify-email/?code={verification_code}"
     subject = 'Verify your email'
     message = f'Click the link to verify your account: {verification_url}'
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=f'<p>Click <a href="{verification_url}">here</a> to verify your email.</p>',
-        fail_silently=False,
-    )
+    html_message = f'<p>Click <a href="{verification_url}">here</a> to verify your email.</p>'
+    return user.email, subject, message, html_message
 
-def send_password_reset_email(user, reset_token):
+def _password_reset_email(user, reset_token):
     reset_url = f"{settings.FRONTEND_URL}/reset-password/{reset_token}"
     subject = 'Reset your password'
     message = f'Click the link to reset your password: {reset_url}'
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=f'<p>Click <a href="{reset_url}">here</a> to reset your password.</p>',
-        fail_silently=False,
-    )
\ No newline at end of file
+    html_message = f'<p>Click <a href="{reset_url}">here</a> to reset your password.</p>'
+    return user.email, subject, message, html_message
+
+def send_verification_email(user, verification_code):
+    return queue_email(*_verification_email(user, verification_code))
+
+def send_password_reset_email(user, reset_token):
+    return queue_email(*_password_reset_email(user, reset_token))
+
+async def asend_verification_email(user, verification_code):
+    return await aqueue_email(*_verification_email(user, verification_code))
+
+async def asend_password_reset_email(user, reset_token):
+    return await aqueue_email(*_password_reset_email(user, reset_token))
+
+def _claim_outbox_batch(batch_size):
+    """
+    Mark up to `batch_size` due emails as SENDING for this worker and return them.
+    Rows stuck in SENDING past their lease (crashed worker) are picked up again.
+    """
+    now = timezone.now()
+    due = (
+        Q(status=OutboundEmail.Status.PENDING, next_attempt_at__lte=now)
+        | Q(status=OutboundEmail.Status.SENDING, locked_until__lte=now)
+    )
+    in_flight = (
+        OutboundEmail.objects.filter(status=OutboundEmail.Status.SENDING, locked_until__gt=now)
+        .order_by().values('status').annotate(count=Count('*')).values('count')
+    )
+    room = Least(Value(batch_size), Value(settings.EMAIL_OUTBOX_MAX_IN_FLIGHT) - Coalesce(Subquery(in_flight), 0))
+    batch = (
+        OutboundEmail.objects.filter(due)
+        .annotate(rank=Window(RowNumber(), order_by=[F('next_attempt_at'), F('pk')]))
+        .filter(rank__lte=room)
+        .values('pk')
+    )
+    claim = uuid.uuid4().hex
+    # One UPDATE counts the emails in flight and claims the batch, so two
+    # workers cannot both fit under EMAIL_OUTBOX_MAX_IN_FLIGHT. Re-applying
+    # `due` skips a row another worker has just taken.
+    claimed = OutboundEmail.objects.filter(due, pk__in=batch).update(
+        status=OutboundEmail.Status.SENDING,
+        claimed_by=claim,
+        locked_until=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+    )
+    if not claimed:
+        return []
+    return list(OutboundEmail.objects.filter(claimed_by=claim, status=OutboundEmail.Status.SENDING))
+
+def _retry_delay(attempts):
+    delay = settings.EMAIL_OUTBOX_RETRY_BACKOFF * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, settings.EMAIL_OUTBOX_RETRY_BACKOFF_MAX))
+
+def _mark_failed(email, error):
+    attempts = email.attempts + 1
+    cleared = {}
+    if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        status = OutboundEmail.Status.FAILED
+        cleared = {'body': '', 'html_body': ''}  # never retried, so drop the codes and links
+    else:
+        status = OutboundEmail.Status.PENDING
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status=status,
+        attempts=attempts,
+        next_attempt_at=timezone.now() + _retry_delay(attempts),
+        locked_until=None,
+        last_error=str(error)[:1000],
+        **cleared,
+    )
+    return status
+
+def drain_email_outbox(batch_size=None):
+    """
+    Send one batch of due emails over a single backend connection.
+    Returns a dict with the number of sent, retried and failed messages.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    result = {'sent': 0, 'retried': 0, 'failed': 0}
+    emails = _claim_outbox_batch(batch_size)
+    if not emails:
+        return result
+
+    connection = get_connection(fail_silently=False, timeout=settings.EMAIL_TIMEOUT)
+    try:
+        with metrics.timer('smtp'):
+            connection.open()
+    except Exception as e:
+        for email in emails:
+            status = _mark_failed(email, e)
+            result['failed' if status == OutboundEmail.Status.FAILED else 'retried'] += 1
+        return result
+
+    try:
+        for email in emails:
+            message = EmailMultiAlternatives(
+                email.subject,
+                email.body,
+                settings.DEFAULT_FROM_EMAIL,
+                [email.to_email],
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+            try:
+                with metrics.timer('smtp'):
+                    message.send()
+            except Exception as e:
+                status = _mark_failed(email, e)
+                result['failed' if status == OutboundEmail.Status.FAILED else 'retried'] += 1
+                continue
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                status=OutboundEmail.Status.SENT,
+                attempts=email.attempts + 1,
+                sent_at=timezone.now(),
+                locked_until=None,
+                last_error='',
+                body='',
+                html_body='',
+            )
+            result['sent'] += 1
+    finally:
+        connection.close()
+        if settings.METRICS_ENABLED:
+            metrics.histograms.maybe_flush()
+    return result
@@ -2,12 +2,14 @@ import uuid
 from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
 from django.conf import settings
+from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView
 
 from .serializers import (
     RegisterSerializer, 
@@ -16,28 +18,53 @@ from .serializers import (
     PasswordResetSerializer, 
     PasswordResetConfirmSerializer, 
     BaseSerializer,
+    ImportUserSerializer,
+    TokenIntrospectionSerializer,
 )
-from .models import CustomUser
+from . import bulk_import
+from .export import FORMATS, export_users
+from .hashers import check_user_password, hash_password, verify_password
+from .introspection import introspect
+from .models import CustomUser, PendingRegistration
+from .response_cache import user_detail_key, user_list_key
+from .tokens import get_tokens_for_user
 from Auth.base import NewAPIView
-from .utils import send_verification_email, send_password_reset_email
+from Auth.caching import CachedResponseMixin
+from Auth.schema import swagger_auto_schema
+from Auth.metrics import timer
+from Auth.permissions import CanIntrospectTokens
+from Auth.pagination import IdCursorPagination
+from Auth.routers import get_read_alias
+from .utils import hash_token, send_verification_email, send_password_reset_email
 
 class RegisterView(NewAPIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'register'
     serializer_class = RegisterSerializer
+    query_budget = 4  # user and pending email checks, pending upsert, outbox INSERT
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        data = serializer.validated_data
+        email = CustomUser.objects.normalize_email(data['email'])
+        if PendingRegistration.live().filter(email=email).exists():
+            return Response({'email': ['custom user with this email address already exists.']}, status=400)
 
-        # Generate and save verification code
+        # Staged until the email is verified; VerifyEmailView creates the user.
         verification_code = uuid.uuid4().hex
-        user.verification_code = verification_code
-        user.verification_code_expiry = timezone.now() + timedelta(minutes=30)
-        user.is_active = False
-        user.save()
+        pending = PendingRegistration(
+            email=email,
+            password=hash_password(data['password']),
+            first_name=data.get('first_name', ''),
+            last_name=data.get('last_name', ''),
+            phone=data.get('phone', ''),
+            verification_code=hash_token(verification_code),
+            expiry=timezone.now() + timedelta(minutes=settings.VERIFICATION_CODE_EXPIRE_MINUTES),
+        )
+        PendingRegistration.stage([pending])
 
-        send_verification_email(user, verification_code)
+        send_verification_email(pending, verification_code)
 
         return Response(
             {"message": "Registration successful. Please check your email to verify."},
@@ -47,12 +74,27 @@ class RegisterView(NewAPIView):
 class VerifyEmailView(NewAPIView):
     permission_classes = [AllowAny]
     serializer_class = BaseSerializer
+    query_budget = 3  # pending lookup, user INSERT, pending DELETE
 
     def get(self, request):
         code = request.GET.get('code')
         if not code:
             return redirect(f"{settings.FRONTEND_URL}/error?message=Missing verification code")
 
+        code = hash_token(code)
+        pending = PendingRegistration.objects.filter(verification_code=code).first()
+        if pending is None:
+            return self.verify_user(code)
+        if pending.expiry < timezone.now():
+            return redirect(f"{settings.FRONTEND_URL}/error?message=Verification code expired")
+        try:
+            pending.promote()
+        except IntegrityError:
+            return redirect(f"{settings.FRONTEND_URL}/error?message=Email already verified")
+        return redirect(f"{settings.FRONTEND_URL}/login?verified=1")
+
+    def verify_user(self, code):
+        # Users registered before signups were staged carry the code themselves.
         try:
             user = CustomUser.objects.get(verification_code=code)
             if user.verification_code_expiry < timezone.now():
@@ -62,7 +104,7 @@ class VerifyEmailView(NewAPIView):
             user.email_verified = True
             user.verification_code = None
             user.verification_code_expiry = None
-            user.save()
+            user.save(update_fields=['is_active', 'email_verified', 'verification_code', 'verification_code_expiry'])
 
             return redirect(f"{settings.FRONTEND_URL}/login?verified=1")
         except CustomUser.DoesNotExist:
@@ -70,7 +112,9 @@ class VerifyEmailView(NewAPIView):
 
 class LoginView(NewAPIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'login'
     serializer_class = LoginSerializer
+    query_budget = 3  # lookup, a rehash UPDATE or, for unknown emails, a pending lookup, then the token family INSERT
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -79,34 +123,52 @@ class LoginView(NewAPIView):
         password = serializer.validated_data['password']
 
         try:
-            user = CustomUser.objects.get(email=email)
-            if not user.check_password(password):
+            with timer('user_lookup'):
+                user = CustomUser.objects.get(email=email)
+            if not check_user_password(user, password):
                 return Response({'error': 'Invalid credentials'}, status=400)
             if not user.email_verified:
                 return Response({'error': 'Please verify your email before logging in.'}, status=403)
-            if not user.email_verified:
-                # Generate new verification code and expiry
-                user.verification_code = uuid.uuid4().hex
-                user.verification_code_expiry = timezone.now() + timedelta(minutes=30)
-                user.save()
-                send_verification_email(user, user.verification_code)
-                return Response(
-                    {'error': 'Please verify your email. A new verification link has been sent.'},
-                    status=403
-                )
-            # If using JWT, generate token here
+            if not user.can_log_in:
+                return Response({'error': 'This account has been suspended.'}, status=403)
             return Response({
                 'uuid': str(user.id),
                 'email': user.email,
                 'role': user.role,
-                'message': 'Login successful'
+                'message': 'Login successful',
+                **get_tokens_for_user(user),
             })
         except CustomUser.DoesNotExist:
+            pending = PendingRegistration.live().filter(email=email).first()
+            if pending and verify_password(password, pending.password):
+                return Response({'error': 'Please verify your email before logging in.'}, status=403)
             return Response({'error': 'Invalid credentials'}, status=400)
 
+class TokenRefreshView(BaseTokenRefreshView):
+    query_budget = 2  # token version check (usually cached), token family UPDATE
+
+class TokenIntrospectView(NewAPIView):
+    permission_classes = [CanIntrospectTokens]
+    serializer_class = TokenIntrospectionSerializer
+    query_budget = 3  # caller's token version check, then one denylist and one version lookup for the batch
+
+    @swagger_auto_schema(
+        operation_summary="Introspect a batch of access tokens (Gateway or admin)",
+        operation_description=(
+            "For API gateways: callers need the `GATEWAY` role or staff status. Checks the signature, expiry and revocation of every token and returns, "
+            "in order, `{\"active\": true, ...claims}` or `{\"active\": false, \"error\": ...}` for each."
+        ),
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': introspect(serializer.validated_data['tokens'])})
+
 class PasswordResetView(NewAPIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'password_reset'
     serializer_class = PasswordResetSerializer
+    query_budget = 3  # lookup, UPDATE, outbox INSERT
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -118,7 +180,7 @@ class PasswordResetView(NewAPIView):
             reset_token = uuid.uuid4().hex
             user.reset_token = reset_token
             user.reset_token_expires = timezone.now() + timedelta(minutes=30)
-            user.save()
+            user.save(update_fields=['reset_token', 'reset_token_expires'])
             send_password_reset_email(user, reset_token)
             return Response({'message': 'Password reset link sent to your email'})
         except CustomUser.DoesNotExist:
@@ -127,6 +189,7 @@ class PasswordResetView(NewAPIView):
 class PasswordResetConfirmView(NewAPIView):
     permission_classes = [AllowAny]
     serializer_class = PasswordResetConfirmSerializer
+    query_budget = 2  # lookup, UPDATE that also bumps token_version
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -137,45 +200,123 @@ class PasswordResetConfirmView(NewAPIView):
         try:
             user = CustomUser.objects.get(reset_token=token)
             if user.reset_token_expires > timezone.now():
-                user.set_password(new_password)
+                user.password = hash_password(new_password)
                 user.reset_token = None
                 user.reset_token_expires = None
-                user.save()
+                user.revoke_tokens(update_fields=['password', 'reset_token', 'reset_token_expires'])
                 return Response({'message': 'Password reset successfully'})
             return Response({'error': 'Reset token expired'}, status=400)
         except CustomUser.DoesNotExist:
             return Response({'error': 'Invalid reset token'}, status=400)
 
-class UserListAPIView(generics.ListAPIView):
+class UserListAPIView(CachedResponseMixin, generics.ListAPIView):
     permission_classes = [IsAdminUser]
-    queryset = CustomUser.objects.all()
+    # Only load the columns UserSerializer emits (no password hash or token columns).
+    queryset = CustomUser.objects.only(*UserSerializer.Meta.fields)
     serializer_class = UserSerializer
+    pagination_class = IdCursorPagination
+    read_replica = True
+    query_budget = 2  # token version check (usually cached), one page
+
+    def get_response_cache_key(self, request, *args, **kwargs):
+        return user_list_key(request)
 
     @swagger_auto_schema(
         operation_summary="List all users (Admin only)",
         operation_description="Retrieve a list of all users. This endpoint is restricted to admin users.",
     )
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+        return self.cached_get(super().get, request, *args, **kwargs)
 
-class UserDetailAPIView(generics.RetrieveAPIView):
+class UserDetailAPIView(CachedResponseMixin, generics.RetrieveAPIView):
     permission_classes = [IsAdminUser]
-    queryset = CustomUser.objects.all()
+    queryset = CustomUser.objects.only(*UserSerializer.Meta.fields)
     serializer_class = UserSerializer
     lookup_field = 'id'
+    read_replica = True
+    query_budget = 2  # token version check (usually cached), the user
+
+    def get_response_cache_key(self, request, *args, **kwargs):
+        return user_detail_key(kwargs['id'])
 
     @swagger_auto_schema(
         operation_summary="Get user details (Admin only)",
         operation_description="Retrieve details of a specific user by their ID. This endpoint is restricted to admin users.",
-        manual_parameters=[
-            openapi.Parameter(
-                'id',
-                openapi.IN_PATH,
-                description="ID of the user to retrieve",
-                type=openapi.TYPE_INTEGER,
-                required=True,
-            )
-        ],
     )
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
\ No newline at end of file
+        return self.cached_get(super().get, request, *args, **kwargs)
+
+class UserExportView(NewAPIView):
+    serializer_class = UserSerializer  # one per row; documents the endpoint
+    permission_classes = [IsAdminUser]
+    read_replica = True
+
+    @swagger_auto_schema(
+        operation_summary="Export all users (Admin only)",
+        operation_description="Stream every user as NDJSON (`fmt=ndjson`, default) or CSV (`fmt=csv`). Add `gzip=1` to compress the stream.",
+    )
+    def get(self, request):
+        fmt = request.GET.get('fmt', 'ndjson')
+        if fmt not in FORMATS:
+            return Response({'error': f"Unsupported format '{fmt}'"}, status=400)
+        compress = request.GET.get('gzip') in ('1', 'true')
+
+        content_type, extension = FORMATS[fmt]
+        filename = f"users.{extension}"
+        if compress:
+            content_type = 'application/gzip'
+            filename += '.gz'
+        # The body is streamed after the request has left the middleware, so pick the database now.
+        queryset = CustomUser.objects.using(get_read_alias())
+        response = StreamingHttpResponse(export_users(fmt, compress, queryset), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class UserImportView(NewAPIView):
+    serializer_class = ImportUserSerializer  # one per row; documents the endpoint
+    permission_classes = [IsAdminUser]
+    query_budget = 1  # caller's token version check; the import runs in `import_users --staged`
+    IMPORT_CONTENT_TYPES = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}
+
+    @swagger_auto_schema(
+        operation_summary="Bulk import users (Admin only)",
+        operation_description=(
+            "Stream users as the request body, CSV (`text/csv`) or NDJSON (`application/x-ndjson`), "
+            "with the registration fields. A row may carry a Django `password_hash` instead of a password. "
+            "Add `verified=1` to create active, verified users instead of queueing verification emails. "
+            "The upload, at most `BULK_IMPORT_MAX_BYTES`, is queued for `manage.py import_users --staged`; "
+            "poll the returned `url` for the result."
+        ),
+    )
+    def post(self, request):
+        fmt = request.GET.get('fmt') or self.IMPORT_CONTENT_TYPES.get(request.content_type)
+        if fmt not in bulk_import.FORMATS:
+            return Response({'error': 'Send text/csv or application/x-ndjson, or pass fmt=csv|ndjson'}, status=400)
+
+        if request.stream is None:
+            return Response({'error': 'The upload is empty'}, status=400)
+        try:
+            upload_id = bulk_import.stage_upload(
+                request.stream,
+                fmt,
+                verified=request.GET.get('verified') in ('1', 'true'),
+            )
+        except bulk_import.UploadTooLarge:
+            return Response({'error': f'Uploads are limited to {settings.BULK_IMPORT_MAX_BYTES} bytes'}, status=413)
+        url = reverse('user-import-status', kwargs={'upload_id': upload_id})
+        return Response({'id': upload_id, 'status': 'queued', 'url': url}, status=status.HTTP_202_ACCEPTED)
+
+class UserImportStatusView(NewAPIView):
+    permission_classes = [IsAdminUser]
+    serializer_class = BaseSerializer
+    query_budget = 1  # caller's token version check
+
+    @swagger_auto_schema(
+        operation_summary="Bulk import status (Admin only)",
+        operation_description="`queued` or `running`, then `done` with the created and failed counts and the row errors.",
+    )
+    def get(self, request, upload_id):
+        result = bulk_import.staged_status(upload_id)
+        if result is None:
+            return Response({'error': 'Import not found'}, status=404)
+        return Response(result)
@@ -0,0 +1,24 @@
+#!/bin/sh
+# Every email the API sends is queued in the outbox and delivered by
+# `manage.py send_queued_emails`; without it no verification or password reset
+# mail goes out. Uploads to users/import/ are only staged, and imported by
+# `manage.py import_users --staged`. Run both next to the server, restarting
+# them if they exit. Set OUTBOX_WORKER=0 or IMPORT_WORKER=0 where one runs as a
+# process of its own instead.
+set -e
+
+run_forever() {
+    (while true; do
+        "$@" || true
+        sleep 5
+    done) &
+}
+
+if [ "${OUTBOX_WORKER:-1}" != "0" ]; then
+    run_forever python manage.py send_queued_emails --loop
+fi
+if [ "${IMPORT_WORKER:-1}" != "0" ]; then
+    run_forever python manage.py import_users --staged --loop
+fi
+
+exec "$@"